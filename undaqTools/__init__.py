@@ -2,6 +2,10 @@
 # Copyright (c) 2013, Roger Lew
 # All rights reserved.
 
-from .daq import Daq, Info, stat
-from .element import Element, fslice, FrameSlice, findex, FrameIndex
-from .dynobj import DynObj
\ No newline at end of file
+from .daq import Daq, Info, stat, iter_daq
+from .catalog import stat_many
+from .element import Element, RaggedElement, FrameAxis, fslice, \
+                      FrameSlice, findex, FrameIndex
+from .dynobj import DynObj
+from .daqindex import DaqIndex
+from .follower import DaqFollower
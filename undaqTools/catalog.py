@@ -0,0 +1,220 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import os
+import sqlite3
+
+from collections import namedtuple
+from multiprocessing.pool import ThreadPool
+from struct import error as StructError
+
+import numpy as np
+
+from undaqTools.daq import Daq, Info
+from undaqTools.daqindex import _parse_frame
+from undaqTools.misc.ast import _literal_eval
+
+# default location of the catalog
+default_catalog = os.path.join(os.path.expanduser('~'),
+                               '.undaqTools_catalog.sqlite')
+
+# number of leading frames (and at most how many bytes of them) used
+# to estimate the frame size
+_sample_frames = 60
+_sample_bytes = 1 << 20
+
+class DriveStat(namedtuple('DriveStat', ['filename', 'size', 'mtime',
+                                         'info', 'elements', 'nframes',
+                                         'duration'])):
+    """
+    Summary of a .daq file from stat_many
+
+    Attributes
+    ----------
+    filename : string
+        path to the .daq file
+
+    size : int
+        size of the file in bytes
+
+    mtime : float
+        modification time of the file
+
+    info : Info
+        drive metadata (see stat)
+
+    elements : list of ElemInfo
+        the element catalog of the drive
+
+    nframes : int
+        estimated number of frames
+
+    duration : float
+        estimated duration of the drive in seconds
+    """
+    __slots__ = ()
+
+ElemInfo = namedtuple('ElemInfo', ['name', 'numvalues', 'units', 'rate',
+                                   'type', 'varrateflag'])
+
+def _stat_drive(filename):
+    """
+    builds the DriveStat of a .daq file by reading its header and first
+    frames
+    """
+    st = os.stat(filename)
+
+    daq = Daq()
+    daq.read_daq(filename, loaddata=False)
+    _header = daq._header
+
+    elements = [ElemInfo(*args) for args in
+                zip(_header.name, _header.numvalues, _header.units,
+                    _header.rate, _header.type, _header.varrateflag)]
+
+    # The frames are mostly the same size. Estimate the number of frames
+    # from the mean size of the first frames (the first frame alone
+    # also holds the initial values of all the CSSDC measures)
+    with open(filename, 'rb') as fid:
+        fid.seek(daq.cursor)
+        buf = np.fromstring(fid.read(_sample_bytes), dtype=np.uint8)
+
+    pos, n = 0, 0
+    while n < _sample_frames:
+        try:
+            code, frame, ids, numitems, end = _parse_frame(buf, pos, _header)
+        except (StructError, IndexError):
+            break
+        if code == -2:
+            break
+        pos, n = end, n + 1
+
+    if n == 0:
+        nframes = 0
+    else:
+        nframes = int(round((st.st_size - daq.cursor)/(pos/float(n))))
+
+    duration = 0.
+    if daq.info.frequency > 0:
+        duration = nframes/float(daq.info.frequency)
+
+    return DriveStat(filename=filename,
+                     size=st.st_size,
+                     mtime=st.st_mtime,
+                     info=daq.info,
+                     elements=elements,
+                     nframes=nframes,
+                     duration=duration)
+
+def _try_stat_drive(filename):
+    """
+    returns the DriveStat of a .daq file or None if it can't be read
+    """
+    try:
+        return _stat_drive(filename)
+    except Exception:
+        return None
+
+def _dumps(drive):
+    """
+    returns the catalog string of a DriveStat
+    """
+    d = dict(drive._asdict())
+    d['info'] = list(drive.info)
+    d['elements'] = [list(e) for e in drive.elements]
+    return repr(d)
+
+def _loads(s):
+    """
+    returns the DriveStat of a catalog string
+    """
+    d = _literal_eval(s)
+    d['info'] = Info(*d['info'])
+    d['elements'] = [ElemInfo(*e) for e in d['elements']]
+    return DriveStat(**d)
+
+def stat_many(paths, workers=8, catalog=default_catalog):
+    """
+    stat_many(paths[, workers=8][, catalog=default_catalog])
+
+    stats many .daq files at once. The headers are read concurrently by
+    a pool of threads. Results are kept in a SQLite catalog keyed on the
+    path, size and modification time of the files so drives that haven't
+    changed are not read again.
+
+    Parameters
+    ----------
+    paths : list_like
+        .daq files to investigate
+
+    workers : int
+        number of threads reading headers
+
+    catalog : string or None
+        string -> path to SQLite catalog (created if it doesn't exist)
+        None -> don't use a catalog
+
+    Returns
+    -------
+    drives : list
+        DriveStat instance for each path (or None if the file couldn't
+        be read)
+
+    Example
+    -------
+    >>> import glob
+    >>> from undaqTools import stat_many
+    >>> for drive in stat_many(glob.glob('*/*.daq'), workers=16):
+    ...     print(drive.filename, drive.nframes, drive.duration)
+    """
+    paths = list(paths)
+    drives = [None for path in paths]
+    keys = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            keys.append((os.path.abspath(path), st.st_size, st.st_mtime))
+        except OSError:
+            keys.append(None)
+
+    con = None
+    if catalog is not None:
+        con = sqlite3.connect(catalog)
+        con.execute('CREATE TABLE IF NOT EXISTS drives '
+                    '(path TEXT PRIMARY KEY, size INTEGER, mtime REAL, '
+                    'stat TEXT)')
+
+        for k, key in enumerate(keys):
+            if key is None:
+                continue
+
+            row = con.execute('SELECT stat FROM drives WHERE '
+                              'path=? AND size=? AND mtime=?', key).fetchone()
+            if row is not None:
+                drives[k] = _loads(row[0])._replace(filename=paths[k])
+
+    # read whatever isn't cataloged
+    todo = [k for k, key in enumerate(keys)
+            if key is not None and drives[k] is None]
+
+    if len(todo) > 0:
+        pool = ThreadPool(max(1, min(workers, len(todo))))
+        try:
+            results = pool.map(_try_stat_drive, [paths[k] for k in todo])
+        finally:
+            pool.close()
+            pool.join()
+
+        for k, drive in zip(todo, results):
+            drives[k] = drive
+            if con is not None and drive is not None:
+                con.execute('INSERT OR REPLACE INTO drives VALUES (?,?,?,?)',
+                            keys[k] + (_dumps(drive),))
+
+    if con is not None:
+        con.commit()
+        con.close()
+
+    return drives
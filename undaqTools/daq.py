@@ -6,15 +6,20 @@ from __future__ import print_function
 # Credits: read_daq, and _loaddata are optimized version of Chris
 #          Schwarz's convert_daq.py scipy in ndaqTools
 
+import multiprocessing
 import os
+import tempfile
+import time
 import warnings
+import weakref
 
 from array import array
 from collections import OrderedDict, namedtuple
+from functools import partial
 from fnmatch import fnmatch
 from operator import attrgetter
 from random import uniform
-from struct import unpack
+from struct import unpack, unpack_from
 
 import h5py
 import matplotlib.pyplot as plt           
@@ -25,9 +30,13 @@ from numpy import fromfile
 from scipy import io as sio
 
 from undaqTools.misc.base import  _size_lookup, _nptype_lookup
-from undaqTools.element import Element, FrameSlice, FrameIndex, findex
-from undaqTools.dynobj import DynObj
-from undaqTools.misc.base import _searchsorted
+from undaqTools.element import Element, RaggedElement, FrameAxis, \
+                                FrameSlice, FrameIndex, findex, \
+                                _frame_search, _frames_contiguous
+from undaqTools.dynobj import DynObj, _name_table
+from undaqTools.daqindex import DaqIndex, load_index, sidecar
+from undaqTools.misc.base import _searchsorted, _parse_bytes
+from undaqTools.selection import ElemSelection, layout_plan
 from undaqTools.misc.recordtype import recordtype
 from undaqTools.misc.ast import _literal_eval, _literal_repr
 
@@ -76,6 +85,41 @@ Header = recordtype('Header', ['id','numvalues', 'name', 'units',
                                'bytes', 'rate', 'type', 'nptype',
                                'varrateflag'])
 
+class LoadPlan(namedtuple('LoadPlan', ['filename', 'nframes', 'missing',
+                                       'elements', 'nbytes', 'peak',
+                                       'seconds', 'exact'])):
+    """
+    Projected cost of reading a .daq file (see Daq.plan)
+
+    Attributes
+    ----------
+    filename : string
+        path to .daq file
+
+    nframes : int
+        (estimated) number of frames in the file
+
+    missing : int
+        (estimated) number of missing frames
+
+    elements : OrderedDict
+        name -> projected bytes of the Element (including its frames)
+
+    nbytes : int
+        projected bytes of all the Elements
+
+    peak : int
+        projected peak memory while reading in bytes
+
+    seconds : float
+        estimated time to unpack the frames
+
+    exact : bool
+        True if the counts come from a complete frame offset index,
+        False if they are extrapolated from the first frames
+    """
+    __slots__ = ()
+
 def stat(filename):
     """
     returns an Info namedtuple instance without loading data
@@ -133,6 +177,563 @@ def stat(filename):
              subject = subject,
              filename = filename)
         
+def _decode_frames(buf, index, _header, mask, i0, iend, alloc=None):
+    """
+    unpacks frames i0 to iend-1 of an indexed .daq file
+
+    The index tells how many times each element occurs in the frames so
+    the arrays of the elements are allocated once at their final size
+    and filled in place.
+
+    Consecutive frames sharing a layout (same cells, same size) are viewed
+    as one structured array so each cell is unpacked with a single field
+    access for the whole run. Frames containing varrateflag cells or a
+    repeated cell are unpacked one cell at a time.
+
+    Parameters
+    ----------
+    buf : np.ndarray (uint8)
+        the .daq file (memory mapped)
+
+    index : DaqIndex
+        frame offset index of the .daq file
+
+    _header : Header
+        element header information
+
+    mask : list of bools
+        specifies which elements (by id) to unpack
+
+    i0, iend : int
+        range of frame indices (not frame numbers) to unpack
+
+    alloc : None or callable
+        None -> arrays are allocated with np.empty
+        callable -> alloc(name, shape, dtype) returns the empty array
+                    of an element (see _spill_allocator)
+
+    Returns
+    -------
+    tmpdata : dict
+        name -> (numvalues x frames) array. varrateflag elements get a
+        list with an array of the values of every frame instead.
+
+        name+'_Frames' -> array of frame numbers (CSSDC only)
+    """
+    iend = max(i0, iend)
+    offsets = index.offsets[i0:iend+1]
+    sizes = np.diff(offsets)
+    layout = index.layout[i0:iend]
+
+    # counting pass
+    counts = index.range_counts(i0, iend)
+
+    if alloc is None:
+        alloc = lambda name, shape, dtype: np.empty(shape, dtype=dtype)
+
+    # fill keeps track of how many samples of each element are unpacked
+    tmpdata, fill = {}, {}
+    for name, i, rate in zip(_header.name, _header.id, _header.rate):
+        if mask[i]:
+            if _header.varrateflag[i]:
+                tmpdata[name] = []
+            else:
+                tmpdata[name] = alloc(name,
+                                      (_header.numvalues[i], counts[i]),
+                                      _header.nptype[i])
+            if rate != 1:
+                tmpdata[name+'_Frames'] = np.empty(counts[i], dtype='i4')
+            fill[name] = 0
+
+    if iend == i0:
+        return tmpdata
+
+    # find the runs of frames with the same layout
+    change = np.flatnonzero(np.logical_or(layout[1:] != layout[:-1],
+                                          sizes[1:] != sizes[:-1])) + 1
+    starts = np.concatenate(([0], change))
+    stops = np.concatenate((change, [len(layout)]))
+
+    # the structured dtypes of the frame layouts are shared by every
+    # drive with the same header
+    plan = layout_plan(_header)
+    for a, b in zip(starts, stops):
+        ids = index.layouts[layout[a]]
+
+        if any(_header.varrateflag[i] for i in ids) or \
+           len(set(ids)) != len(ids):
+            for k in xrange(a, b):
+                _decode_frame(buf, int(offsets[k]), ids,
+                              _header, mask, tmpdata, fill)
+            continue
+
+        dtype = plan.template(ids, [_header.numvalues[i] for i in ids])
+        assert dtype.itemsize == sizes[a]
+
+        arr = buf[offsets[a]:offsets[b]].view(dtype)
+        for j, i in enumerate(ids):
+            if not mask[i]:
+                continue
+
+            name = _header.name[i]
+            k0, k1 = fill[name], fill[name] + b - a
+            tmpdata[name][:, k0:k1] = arr['v%i'%j].reshape(b - a, -1).T
+
+            if _header.rate[i] != 1:
+                tmpdata[name+'_Frames'][k0:k1] = arr['frame']
+
+            fill[name] = k1
+
+    return tmpdata
+
+def _decode_frame(buf, pos, ids, _header, mask, tmpdata, fill):
+    """
+    unpacks the frame beginning at byte pos one cell at a time into tmpdata
+    (see _decode_frames)
+    """
+    frame = unpack_from('i', buf, pos + 4)[0]
+    pos += 12
+
+    for i in ids:
+        if _header.varrateflag[i]:
+            numitems = unpack_from('i', buf, pos + 4)[0]
+            pos += 8
+        else:
+            numitems = _header.numvalues[i]
+            pos += 4
+
+        if mask[i]:
+            name = _header.name[i]
+            typ = _header.nptype[i]
+            k = fill[name]
+
+            if not _header.varrateflag[i]:
+                tmpdata[name][:, k] = np.frombuffer(buf, typ, numitems, pos)
+            else:
+                # views into buf, they are packed by _cast_element
+                tmpdata[name].append(np.frombuffer(buf, typ, numitems, pos))
+
+            if _header.rate[i] != 1:
+                tmpdata[name+'_Frames'][k] = frame
+
+            fill[name] = k + 1
+
+        pos += numitems*_header.bytes[i]
+
+def _join_blocks(parts, out=None):
+    """
+    joins the tmpdata of an element from consecutive pieces of frames
+    (see _decode_frames). Arrays are joined into out if it is given.
+    """
+    if isinstance(parts[0], list):
+        return [v for part in parts for v in part]
+
+    return np.concatenate(parts, axis=-1, out=out)
+
+def _spill_array(shape, dtype, spill_dir=None):
+    """
+    returns an empty array backed by a scratch file in spill_dir. The
+    file is removed right away (where the OS allows it) and its space is
+    freed with the array.
+    """
+    if np.prod(shape) == 0:
+        return np.empty(shape, dtype=dtype)
+
+    fd, path = tempfile.mkstemp(suffix='.spill', dir=spill_dir)
+    os.close(fd)
+    arr = np.memmap(path, dtype=dtype, mode='w+', shape=shape)
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return arr
+
+def _spill_allocator(nbytes, max_memory, spill_dir=None):
+    """
+    returns an alloc function for _decode_frames that keeps the smallest
+    elements in memory while they fit in max_memory bytes and backs the
+    rest with scratch files
+
+    nbytes is a dict of name -> projected bytes of the elements
+    """
+    spill, total = set(), 0
+    for name, b in sorted(nbytes.items(), key=lambda kv: kv[1]):
+        if total + b <= max_memory:
+            total += b
+        else:
+            spill.add(name)
+
+    def alloc(name, shape, dtype):
+        if name in spill:
+            return _spill_array(shape, dtype, spill_dir)
+        return np.empty(shape, dtype=dtype)
+
+    return alloc
+
+def _cell_positions(index, _header, i, n):
+    """
+    returns the byte offset of the values of element i in each of the
+    first n frames or None if the element isn't in every frame (or its
+    position depends on a varrateflag cell)
+    """
+    cellpos = np.zeros(len(index.layouts), dtype=np.int64) - 1
+    for l, ids in enumerate(index.layouts):
+        pos = 12
+        for j in ids:
+            if j == i:
+                cellpos[l] = pos + 4
+                break
+
+            if _header.varrateflag[j]:
+                break
+
+            pos += 4 + _header.numvalues[j]*_header.bytes[j]
+
+    cellpos = cellpos[index.layout[:n]]
+    if np.any(cellpos < 0):
+        return None
+
+    return index.offsets[:n] + cellpos
+
+def _strided_view(buf, positions, dtype, numvalues):
+    """
+    returns a (numvalues x frames) array of the values at the byte
+    positions of buf.
+
+    If the positions are evenly spaced the array is a view into buf.
+    Otherwise each evenly spaced run of positions is copied out.
+    """
+    itemsize = dtype.itemsize
+
+    if len(positions) < 2:
+        out = np.zeros((numvalues, len(positions)), dtype=dtype)
+        if len(positions) == 1:
+            out[:, 0] = np.frombuffer(buf, dtype, numvalues, positions[0])
+        return out
+
+    steps = np.diff(positions)
+    if np.all(steps == steps[0]):
+        return np.ndarray((numvalues, len(positions)), dtype=dtype,
+                          buffer=buf, offset=int(positions[0]),
+                          strides=(itemsize, int(steps[0])))
+
+    out = np.empty((numvalues, len(positions)), dtype=dtype)
+    starts = np.concatenate(([0], np.flatnonzero(steps[1:] != steps[:-1])+1))
+    stops = np.concatenate((starts[1:], [len(positions)]))
+    for a, b in zip(starts, stops):
+        step = steps[a] if b - a > 1 else 0
+        out[:, a:b] = np.ndarray((numvalues, b - a), dtype=dtype,
+                                 buffer=buf, offset=int(positions[a]),
+                                 strides=(itemsize, int(step)))
+    return out
+
+def _mmap_element(buf, index, _header, i, frames, bombed, n):
+    """
+    builds the Element with id i from a memory mapped .daq file
+    (see Daq.open_mmap)
+    """
+    if _header.rate[i] == 1 and not _header.varrateflag[i]:
+        positions = _cell_positions(index, _header, i, n)
+
+        if positions is not None:
+            data = _strided_view(buf, positions, _header.nptype[i],
+                                 _header.numvalues[i])
+            return Element(data,
+                           frames,
+                           copy=False,
+                           rate=_header.rate[i],
+                           name=_header.name[i],
+                           dtype=_header.type[i],
+                           varrateflag=_header.varrateflag[i],
+                           elemid=_header.id[i],
+                           units=_header.units[i])
+
+    # unpack just this element
+    mask = [j == i for j in _header.id]
+    tmpdata = _decode_frames(buf, index, _header, mask, 0, len(index))
+    return _cast_element(i, tmpdata, _header, frames, bombed, n)
+
+def _cast_element(i, tmpdata, _header, frames, bombed, n):
+    """
+    builds the Element with id i from the tmpdata of _decode_frames.
+    The tmpdata of the element is deleted as we go to save memory.
+
+    frames are the frame numbers (FrameAxis) of the non-CSSDC Elements
+    and n is the number of frames they should have
+    (see Daq._frame_from_index)
+    """
+    name = _header.name[i]
+    rate = _header.rate[i]
+
+    if _header.varrateflag[i]:
+        return _cast_ragged(i, tmpdata, _header, frames, bombed, n)
+    elif tmpdata[name].size == 0:
+        # Elements that never occur are empty like they've always been
+        tmpdata[name] = np.array([])
+    elif rate == 1 and bombed:
+        tmpdata[name] = tmpdata[name][:, :n]
+
+    if rate != 1:
+        frames = tmpdata[name+'_Frames']
+        del tmpdata[name+'_Frames']
+
+    elem = Element(tmpdata[name],
+                   frames,
+                   copy=False,
+                   rate=_header.rate[i],
+                   name=_header.name[i],
+                   dtype=_header.type[i],
+                   varrateflag=_header.varrateflag[i],
+                   elemid=_header.id[i],
+                   units=_header.units[i])
+
+    del tmpdata[name]
+    return elem
+
+def _cast_ragged(i, tmpdata, _header, frames, bombed, n):
+    """
+    builds the RaggedElement of the varrateflag element with id i from
+    the tmpdata of _decode_frames (see _cast_element)
+    """
+    name = _header.name[i]
+    rate = _header.rate[i]
+
+    samples = tmpdata.pop(name)
+    if rate == 1 and bombed:
+        samples = samples[:n]
+
+    if rate != 1:
+        frames = tmpdata.pop(name+'_Frames')
+
+    # the values of all the frames are packed end to end
+    offsets = np.zeros(len(samples) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in samples], out=offsets[1:])
+
+    if len(samples) > 0:
+        values = np.concatenate(samples)
+    else:
+        values = np.zeros(0, dtype=_header.nptype[i])
+
+    return RaggedElement(values,
+                         offsets,
+                         frames,
+                         rate=_header.rate[i],
+                         name=_header.name[i],
+                         dtype=_header.type[i],
+                         varrateflag=_header.varrateflag[i],
+                         elemid=_header.id[i],
+                         units=_header.units[i],
+                         numvalues=_header.numvalues[i])
+
+def _read_ragged(values, offsets, i0, iend):
+    """
+    reads samples i0 to iend of a ragged element from its HDF5 values
+    and offsets datasets. Returns (values, offsets) of the samples.
+    """
+    offsets = offsets[:]
+    a, b, step = slice(i0, iend).indices(len(offsets) - 1)
+    b = max(a, b)
+
+    return (values[offsets[a]:offsets[b]] if offsets[b] > offsets[a] else
+            np.zeros(0, dtype=values.dtype),
+            offsets[a:b+1] - offsets[a])
+
+# rows per block of the coarse frame index of datasets that aren't
+# chunked (see _write_frame_attrs)
+_frame_block = 1024
+
+def _write_frame_attrs(ds, frames, block=None):
+    """
+    stores metadata of the (increasing) frames of a HDF5 dataset so
+    frame ranges can be found without reading it (see
+    _hd5_frame_range). Besides the first and last frame and whether
+    there are gaps, the first frame of every block of rows is kept as
+    a coarse index.
+    """
+    frames = np.asarray(frames).flatten()
+    if len(frames) == 0:
+        return
+
+    if block is None:
+        block = _frame_block
+
+    ds.attrs['first_frame'] = frames[0]
+    ds.attrs['last_frame'] = frames[-1]
+    ds.attrs['contiguous'] = int(_frames_contiguous(frames))
+    ds.attrs['block'] = block
+    ds.attrs['block_frames'] = frames[::block]
+
+def _hd5_searchsorted(ds, v):
+    """
+    _searchsorted(ds[:], v) of a frames dataset. Reads at most one
+    block of the dataset when it has the metadata of
+    _write_frame_attrs (and all of it when it doesn't).
+    """
+    attrs = ds.attrs
+    if 'contiguous' not in attrs:
+        return _searchsorted(ds[:], v)
+
+    n = ds.shape[-1]
+    if attrs['last_frame'] <= v:
+        return n - 1
+
+    first = attrs['first_frame']
+    if v <= first:
+        return 0
+
+    if attrs['contiguous']:
+        return int(min(np.ceil(v - first), n))
+
+    # the block with the last first frame at or before v holds the
+    # first frame at or after v (or it is the first of the next block)
+    block = int(attrs['block'])
+    b = np.searchsorted(attrs['block_frames'], v, side='right') - 1
+    lo = b*block
+    rows = ds[lo:min(lo + block, n)]
+    return lo + int(np.searchsorted(rows, v))
+
+def _hd5_frame_range(ds, f0, fend):
+    """
+    returns the (i0, iend) rows of a frames dataset holding f0 to fend
+    (like the frame ranges of read_daq, see _hd5_searchsorted)
+    """
+    n = ds.shape[-1]
+    i0, iend = 0, n
+    if n == 0:
+        return i0, iend
+
+    if f0 is not None:
+        i0 = _hd5_searchsorted(ds, f0)
+    if fend is not None:
+        iend = _hd5_searchsorted(ds, fend)
+        if iend < n:
+            iend += 1
+    return i0, iend
+
+def _hd5_cast(i, tmpdata, _header, axis):
+    """
+    pops the data of element i from tmpdata (see Daq.read_hd5) and
+    returns it as an Element or RaggedElement
+    """
+    name, rate = _header.name[i], _header.rate[i]
+    kwds = dict(rate=rate,
+                name=name,
+                dtype=_header.type[i],
+                varrateflag=_header.varrateflag[i],
+                elemid=_header.id[i],
+                units=_header.units[i])
+
+    frames = axis
+    if rate != 1:
+        frames = tmpdata.pop(name+'_Frames').flatten()
+
+    if isinstance(tmpdata.get(name), tuple):
+        values, offsets = tmpdata.pop(name)
+        return RaggedElement(values, offsets, frames,
+                             numvalues=_header.numvalues[i], **kwds)
+
+    return Element(tmpdata.pop(name), frames, **kwds)
+
+def _hd5_element(root, _header, i, axis, interpolated):
+    """
+    reads element i from an open HDF5 container (see Daq.open_hd5)
+    """
+    name = _header.name[i]
+    data = root['data']
+
+    tmpdata = {}
+    if name + '_Offsets' in data:
+        tmpdata[name] = _read_ragged(data[name], data[name+'_Offsets'],
+                                     0, None)
+    else:
+        tmpdata[name] = data[name][...]
+
+    if _header.rate[i] != 1:
+        tmpdata[name+'_Frames'] = data[name+'_Frames'][...]
+
+    elem = _hd5_cast(i, tmpdata, _header, axis)
+    if data[name].attrs.get('interpolated', 0):
+        elem.interpolated = interpolated
+    return elem
+
+def _decode_chunk(args):
+    """
+    unpacks the frames of a piece of a .daq file in a worker process
+    (see _decode_parallel)
+
+    arguments passed as tuple to make it work with multiprocessing pool
+    """
+    (filename, elemlist, index) = args
+
+    # the header is cheap to read again
+    daq = Daq()
+    daq.read_daq(filename, elemlist=elemlist, loaddata=False)
+    mask = daq._elemlist_mask(daq._header)
+
+    buf = np.memmap(filename, dtype=np.uint8, mode='r').view(np.ndarray)
+    return _decode_frames(buf, index, daq._header, mask, 0, len(index))
+
+def _decode_parallel(filename, elemlist, index, i0, iend, workers,
+                     alloc=None):
+    """
+    unpacks frames i0 to iend-1 like _decode_frames but splits them at
+    frame boundaries into pieces that are unpacked by a pool of worker
+    processes. The pieces are joined in frame order (into arrays from
+    alloc if it is given).
+    """
+    splits = index.split(4*workers, i0, iend)
+    args = [(filename, elemlist, index.take(a, b))
+            for a, b in zip(splits[:-1], splits[1:])]
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        results = pool.map(_decode_chunk, args)
+    finally:
+        pool.close()
+        pool.join()
+
+    tmpdata = {}
+    for name in results[0].keys():
+        parts = [result.pop(name) for result in results]
+
+        out = None
+        if alloc is not None and not isinstance(parts[0], list) and \
+           not name.endswith('_Frames'):
+            shape = (parts[0].shape[0], sum(p.shape[1] for p in parts))
+            out = alloc(name, shape, parts[0].dtype)
+
+        tmpdata[name] = _join_blocks(parts, out)
+        del parts
+    return tmpdata
+
+def _create_dataset(group, name, data, chunk, **filters):
+    """
+    creates the dataset name in group chunked along its last axis with
+    chunk items per chunk and the compression filters
+
+    Empty datasets (which can't be chunked) are stored contiguously.
+    """
+    data = np.asarray(data)
+    if data.size == 0 or (chunk is None and not filters):
+        return group.create_dataset(name, data=data)
+
+    chunks = True
+    if chunk is not None:
+        chunks = data.shape[:-1] + (max(1, min(chunk, data.shape[-1])),)
+
+    return group.create_dataset(name, data=data, chunks=chunks, **filters)
+
+def _range_args(args):
+    """
+    returns (start, stop) of fslice-style ([start,] stop) arguments
+    """
+    if len(args) == 1:
+        return None, args[0]
+    elif len(args) == 2:
+        return args[0], args[1]
+
+    raise TypeError('expected 1 or 2 arguments, got %i'%len(args))
+
 class Daq(dict):
     def __init__(self):
         """Abstraction of NADS .daq data"""
@@ -164,8 +765,24 @@ class Daq(dict):
         self.fend = None             # last Frame in Daq
         self.cursor = 0              # byte where the data frames begin in daq
         self.dynobjs = OrderedDict() # object to hold dynamic objects
+        self.index = None            # DaqIndex of frame offsets
         self.etc = {}
 
+        # name -> callable returning the Element for Elements that get
+        # materialised the first time they are accessed (see open_mmap)
+        self._loaders = {}
+        self._mmap = None
+
+        # open HDF5 file and LRU cache of the Elements read from it
+        # (see open_hd5). name -> nbytes, least recently used first
+        self._hd5 = None
+        self._lru = None
+        self._lru_budget = None
+        self._lru_bytes = 0
+
+        # name -> (weakref to Element, monotone index) cached by dslice
+        self._monotone = {}
+
         dict.__init__(self)
 
     def load_elemlist_fromfile(self, filename):
@@ -174,13 +791,22 @@ class Daq(dict):
 
     def read_daq(self, filename, elemlist=None,
                  loaddata=True, process_dynobjs=True,
-                 interpolate_missing_frames=True):
+                 interpolate_missing_frames=True, index=False,
+                 f0=None, fend=None, workers=1,
+                 max_memory=None, spill_dir=None):
         """
         read_daq(filename[, elemlist=None]
-                 [, loaddata=True][, process_dynobjs=True])
+                 [, loaddata=True][, process_dynobjs=True][, index=False]
+                 [, f0=None][, fend=None][, workers=1]
+                 [, max_memory=None][, spill_dir=None])
                  
         Reads a .daq file into object
 
+        f0 and fend specify frame range to read. Only the frames in the
+        range are unpacked. CSSDC Elements also get the last state they
+        recorded before f0 so they are defined from the start of the
+        range.
+
         read <==> read_daq
 
         Parameters
@@ -199,6 +825,43 @@ class Daq(dict):
         process_dynobjs : bool
              True -> process dynobjs and put them in self.dynobjs
              False -> don't load dynobjs        
+
+        interpolate_missing_frames : bool or 'ffill'
+             True -> interpolate non-CSSDC elements over missing frames
+                     (see _interpolate_missing_frames)
+             'ffill' -> same but categorical and integer cells are
+                        forward filled instead of left with their own
+                        frames
+             False -> leave missing frames missing
+
+        index : bool
+             True -> load the frame offset index into self.index from the
+                     .daqidx sidecar (the sidecar is built and saved if it
+                     is missing or stale)
+             False -> don't load the index
+
+        f0 : None or int
+            None -> read from beginning of file
+            int -> read from this frame
+
+        fend : None or int
+            None -> read to end of file
+            int -> read to this frame
+
+        workers : int
+            number of processes unpacking frames. With more than 1 the
+            frames are split into pieces that are unpacked in parallel
+
+        max_memory : None, int or string
+            None -> keep all Elements in memory
+            int or string (e.g. '4GB') -> keep the smallest Elements in
+                memory while they fit in this many bytes. The data of
+                the others is backed by scratch files (np.memmap). The
+                Elements behave the same either way.
+
+        spill_dir : None or string
+            directory for the scratch files (defaults to the system
+            temporary directory)
         """        
         
         _header = \
@@ -269,9 +932,12 @@ class Daq(dict):
         self._header = _header
 
         fid.close()
+
+        if index:
+            self.index = load_index(filename, self.cursor, _header)
         
         if loaddata:
-            self._loaddata()
+            self._loaddata(f0, fend, workers, max_memory, spill_dir)
             self._unwrap_lane_deviation()
 
         if loaddata and process_dynobjs:
@@ -292,214 +958,382 @@ class Daq(dict):
             msg = "Missing %i frames."%missing_frames
             if interpolate_missing_frames:
                 msg += " (interpolated missing frames)"
-                self._interpolate_missing_frames()
+                self._interpolate_missing_frames(
+                    ffill=interpolate_missing_frames == 'ffill')
             warnings.warn(msg, RuntimeWarning)
             
     # create alias read for read_daq
     read = read_daq
+
+    @classmethod
+    def plan(cls, filename, elemlist=None, interpolate_missing_frames=True,
+             sample_frames=1000):
+        """
+        plan(filename[, elemlist=None][, interpolate_missing_frames=True]
+             [, sample_frames=1000])
+
+        Projects how much memory and time reading a .daq file will take
+        without reading it. Only the header and the first sample_frames
+        frames are read, unless a valid .daqidx sidecar has the exact
+        element counts. Unpacking the sampled frames measures the
+        throughput used to estimate the time.
+
+        Elements that get interpolated over missing frames are
+        projected with every frame. Dynamic objects are not included.
+
+        Parameters
+        ----------
+        filename : string
+            path to .daq file
+
+        elemlist : None or list_like
+             None -> plan for all elements
+             list_like -> plan for names that match list
+
+        interpolate_missing_frames : bool or 'ffill'
+             whether read_daq will interpolate missing frames
+
+        sample_frames : int
+            number of frames to sample
+
+        Returns
+        -------
+        plan : LoadPlan
+        """
+        daq = cls()
+        daq.read_daq(filename, elemlist=elemlist, loaddata=False)
+        _header = daq._header
+        mask = daq._elemlist_mask(_header)
+        size = os.stat(filename).st_size
+
+        # exact counts if the sidecar has them
+        index = None
+        if os.path.exists(sidecar(filename)):
+            try:
+                index = DaqIndex.read(sidecar(filename), daq_filename=filename)
+            except (ValueError, IOError):
+                index = None
+            if index is not None and \
+               (not index.isvalid() or index.cursor != daq.cursor):
+                index = None
+        exact = index is not None
+
+        buf = np.memmap(filename, dtype=np.uint8, mode='r').view(np.ndarray)
+        if len(buf) - daq.cursor >= 12:
+            frame0 = unpack_from('i', buf, daq.cursor + 4)[0]
+            sample = DaqIndex.build(filename, daq.cursor, _header,
+                                    fend=frame0 + sample_frames - 1)
+        else:
+            sample = DaqIndex()
+            sample.offsets[0] = daq.cursor
+
+        # read_daq also interpolates when the file did not close properly
+        terminated = unpack_from('i', buf, len(buf) - 4)[0] == -2
+
+        # measure the throughput
+        n = len(sample)
+        t0 = time.time()
+        _decode_frames(buf, sample, _header, mask, 0, n)
+        elapsed = time.time() - t0
+        del buf
+
+        if n > 0:
+            sampled_bytes = sample.offsets[-1] - sample.offsets[0]
+            scale = (size - daq.cursor)/float(sampled_bytes)
+        else:
+            scale = 0.
+        seconds = elapsed*scale
+
+        if exact:
+            nframes = len(index)
+            missing = 0
+            if nframes > 0:
+                missing = index.frame[-1] - index.frame[0] + 1 - nframes
+            counts = index.counts
+            numitems = index.numitems
+            terminated = index.terminated
+        else:
+            nframes = int(round(n*scale))
+            missing = 0
+            if n > 0:
+                missing = sample.frame[-1] - sample.frame[0] + 1 - n
+                missing = int(round(missing*scale))
+            counts = np.round(sample.counts*scale)
+            numitems = np.round(sample.numitems*scale)
+
+        # interpolated elements get every frame (and keep their type)
+        widen = interpolate_missing_frames and (missing > 0 or not terminated)
+        ffill = interpolate_missing_frames == 'ffill'
+        exclude = ElemSelection.compile(interpolation_wclist)
+
+        elements = OrderedDict()
+        widened = [0]
+        for name, i in zip(_header.name, _header.id):
+            if not mask[i]:
+                continue
+
+            itemsize = _header.nptype[i].itemsize
+            if _header.varrateflag[i]:
+                nbytes = numitems[i]*itemsize + 4*counts[i]
+            elif _header.rate[i] != 1:
+                nbytes = (_header.numvalues[i]*itemsize + 4)*counts[i]
+            elif widen and (ffill or not (_header.type[i] == 'c' or
+                                          exclude.match(name))):
+                nbytes = (_header.numvalues[i]*itemsize + 4)*\
+                         (nframes + missing)
+                widened.append(nbytes)
+            else:
+                nbytes = (_header.numvalues[i]*itemsize + 4)*nframes
+            elements[name] = int(nbytes)
+
+        nbytes = sum(elements.values())
+
+        # while interpolating an element the old and new arrays coexist.
+        # The frame offset index takes 20 bytes a frame
+        peak = nbytes + max(widened) + 20*nframes
+
+        return LoadPlan(filename=filename,
+                        nframes=int(nframes),
+                        missing=int(missing),
+                        elements=elements,
+                        nbytes=int(nbytes),
+                        peak=int(peak),
+                        seconds=seconds,
+                        exact=exact)
+
+    def open_mmap(self, filename, elemlist=None):
+        """
+        open_mmap(filename[, elemlist=None])
+
+        Memory maps a .daq file instead of reading it. Elements are
+        materialised the first time they are accessed.
+
+        Non-CSSDC elements found at a fixed stride through the file are
+        read-only views straight into the mapped file. Elements that move
+        around (e.g. because CSSDC cells come and go) are gathered from
+        the map and everything else (CSSDC and varrateflag elements) is
+        unpacked from it when accessed.
+
+        The frame offset index is kept in the .daqidx sidecar, so after
+        the first time a drive opens without reading its frames.
+        Dynamic objects are not processed and missing frames are not
+        interpolated.
+
+        Parameters
+        ----------
+        filename : string
+            path to .daq file
+
+        elemlist : None or list_like
+             None -> expose all elements
+             list_like -> expose names that match list
+        """
+        self._loaders = {}
+        self.read_daq(filename, elemlist=elemlist, loaddata=False)
+
+        _header = self._header
+        mask = self._elemlist_mask(_header)
+        self.index = index = self._get_index(_header, save=True)
+        bombed, n = self._frame_from_index(index)
+
+        self._mmap = np.memmap(filename, dtype=np.uint8, mode='r')
+        buf = self._mmap.view(np.ndarray)
+        frames = FrameAxis(self.frame.frame)
+
+        for name, i in zip(_header.name, _header.id):
+            if mask[i]:
+                self._loaders[name] = \
+                    partial(_mmap_element, buf, index, _header, i,
+                            frames, bombed, n)
+
+        self._header = None
                 
-    def _loaddata(self):
+    def _loaddata(self, f0=None, fend=None, workers=1,
+                  max_memory=None, spill_dir=None):
         """
-        loads data from .daq file
+        loads data from .daq file (frames f0 to fend)
         """
         _header = self._header
-        elemlist = self.elemlist
-        frame = self.frame
-        
-        def nans(numitems):
-            return [np.nan for i in xrange(numitems)]
+        mask = self._elemlist_mask(_header)
+        index = self._get_index(_header, fend=fend)
+
+        i0, iend = index.frame_range(f0, fend)
+        if iend == i0:
+            raise ValueError('no frames between f0=%s and fend=%s'%(f0, fend))
+
+        # the index tells us how big every element will be so we can
+        # decide up front which ones go to scratch files
+        alloc = None
+        if max_memory is not None:
+            counts = index.range_counts(i0, iend)
+            nbytes = {}
+            for name, i in zip(_header.name, _header.id):
+                if mask[i] and not _header.varrateflag[i]:
+                    nbytes[name] = counts[i]*_header.numvalues[i]*\
+                                   _header.nptype[i].itemsize
+            alloc = _spill_allocator(nbytes, _parse_bytes(max_memory),
+                                     spill_dir)
 
-        _elemid_lookup = dict(zip(_header.name, _header.id))
-        
         # Data gets unpacked to a temporary dict tmpdata before building
-        # Element objects
-        # 
-        # We will unpack 1d elements to an array object and then
-        # change them to 2d ndarrays after the data is loaded.
-        #
-        # Elements with more than 1 dimension will get unpacked
-        # as lists of arrays and transformed to ndarrays after
-        # the data is loaded
-        #
-        # The array.array objects are typed unlike regular lists.
-        # This improves memory usage. The array.array objects also
-        # have highly efficient appending unlike ndarrays
-        
-        # initialize temporary dict
-        tmpdata = {}        
-        for name, typ, varrate, numvalues in \
-            zip(_header.name, _header.type, 
-                _header.varrateflag, _header.numvalues):
-            if elemlist is None or any(fnmatch(name, wc) for wc in elemlist):
-                if not varrate and numvalues == 1:
-                    tmpdata[name] = array(typ)
-                else:
-                    tmpdata[name] = []
+        # Element objects. See _decode_frames for what tmpdata holds
+        buf = np.memmap(self.info.filename, dtype=np.uint8, mode='r')
+        buf = buf.view(np.ndarray)
+        if workers > 1 and iend - i0 > workers:
+            tmpdata = _decode_parallel(self.info.filename, self.elemlist,
+                                       index, i0, iend, workers, alloc)
+        else:
+            tmpdata = _decode_frames(buf, index, _header, mask, i0, iend,
+                                     alloc)
+
+        # CSSDC elements only record when they change. To know their
+        # state at the start of the range we also need the last values
+        # they recorded before it. Elements last recorded on the same
+        # frame are unpacked together.
+        if i0 > 0:
+            prior = {}
+            for i, rate in zip(_header.id, _header.rate):
+                if mask[i] and rate != 1:
+                    k = index.last_with(i, i0)
+                    if k >= 0:
+                        prior.setdefault(k, []).append(i)
+
+            for k, ids in prior.iteritems():
+                kmask = [i in ids for i in _header.id]
+                state = _decode_frames(buf, index, _header, kmask, k, k + 1)
+                for i in ids:
+                    for name in (_header.name[i], _header.name[i]+'_Frames'):
+                        tmpdata[name] = _join_blocks([state[name],
+                                                      tmpdata[name]])
+        del buf
+
+        bombed, n = self._frame_from_index(index, i0, iend)
+
+        # the non-CSSDC Elements share one frame axis
+        axis = FrameAxis(self.frame.frame)
 
-        # Intialize Frame arrays for CSSDC measures
-        for name in tmpdata.keys():
-            if _header.rate[_elemid_lookup[name]] != 1:
-                tmpdata[name+'_Frames'] = array('i')
+        # cast as Element objects
+        # 'varrateflag' variables become RaggedElements
+        #
+        # There are obvious more compact ways to write this but I'm
+        # paranoid about reference counting and garbage collection not
+        # functioning properly
+        for name, i in zip(_header.name, _header.id):
+            if not mask[i]:
+                continue
 
-        fid = open(self.info.filename,'rb')
-        read = fid.read # dots make things slow...
-        read(self.cursor) # move to where the data begins
+            self[name] = _cast_element(i, tmpdata, _header,
+                                       axis, bombed, n)
+        
+        del _header, self._header
+        self._header = None
 
-        # The daq files have a frame for every sample. Each frame
-        # contains the variables states at the time the frame was
-        # saved. 
-        #
+    def _elemlist_mask(self, _header):
+        """
+        returns list of bools specifying which elements (by id) match
+        self.elemlist
+        """
         # we want to create arrays that can be indexed to decide
         # whether the variable needs stored. This way we don't
         # have to look through the elemlist for every variable on
-        # every frame
-        if elemlist is None: # elemlist empty                    
-            mask = [True for i in xrange(len(_header.name))]
-        else:
-            mask = []
-            for name in _header.name:
-                mask.append(any(fnmatch(name, wc) for wc in elemlist))
-
-        bombed = False
-        # Python quirk no. 372837462: while 1 is faster than while True
-        while 1:
-            try:
-                frame.code.append(unpack('i',read(4))[0])
-                if frame.code[-1] == -2:
-                    break
-                
-                frame.frame.append(unpack('i', read(4))[0])
-                frame.count.append(unpack('i', read(4))[0])
+        # every frame. The mask is part of the layout plan so it is
+        # only built once for drives with the same header and elemlist
+        return layout_plan(_header, self.elemlist).mask
 
-                # xrange (2.7, range in 3) is faster than range
-                for j in xrange(frame.count[-1]):
-                    i = unpack('i', read(4))[0]
+    def _get_index(self, _header, save=False, fend=None):
+        """
+        returns the frame offset index of the .daq file. If the index has
+        to be built and fend is given only the frames up to fend are
+        indexed.
+        """
+        # The frame offset index tells us where every frame begins and
+        # what cells it contains. If read_daq didn't load it we build it
+        # now (the .daqidx sidecar gets used if it is still valid).
+        index = self.index
+        if index is None or index.filename != self.info.filename or \
+           not index.isvalid():
+            index = load_index(self.info.filename, self.cursor,
+                               _header, save=save, fend=fend)
+        return index
+
+    def _frame_from_index(self, index, i0=0, iend=None):
+        """
+        sets self.frame, self.f0 and self.fend from the frame offset index
+        for the frames with indices i0 to iend-1
 
-                    if _header.varrateflag[i]:
-                        numitems = unpack('i', read(4))[0]
-                    else:
-                        numitems = _header.numvalues[i]
-                                
-                    size = _header.bytes[i]
-                        
-                    if mask[i]:
-                        name = _header.name[i]
-                        
-                        if numitems == 1:
-                            typ = _header.type[i]
-                            tmpdata[name].append(unpack(typ,read(size))[0])
-                                
-                        else: # numitems > 1
-                            typ = _header.nptype[i]
-                            tmpdata[name].append(fromfile(fid,typ,numitems))
-                            
-                        if _header.rate[i] != 1:
-                            tmpdata[name+'_Frames'].append(frame.frame[-1])
-                            
-                    else: # we don't need to read this element
-                        read(numitems*size) # seek is slow...
-                                            # reduce calls to read
-            except:
-                msg = 'Failed loading file on frame %i.'%frame.frame[-1]
-                msg += ' (stopped reading file)'
-                warnings.warn(msg, RuntimeWarning)
-                bombed = True
-                break
+        Returns
+        -------
+        (bombed, n) : tuple
+            bombed is True if the file did not close properly and n is
+            the number of frames the non-CSSDC Elements should have
+        """
+        frame = self.frame
+        if iend is None:
+            iend = len(index)
+
+        # the end of the file only matters if the range reaches it
+        toend = iend == len(index)
+
+        # The frame bookkeeping comes straight from the index. Like the
+        # daq the codes end with -2 if the file closed properly
+        code = np.asarray(index.code[i0:iend], 'i4')
+        frame.code = array('i', code.tostring())
+        if toend and index.terminated:
+            frame.code.append(-2)
+
+        counts = np.array([len(ids) for ids in index.layouts], dtype='i4')
+        frame.count = array('i', counts[index.layout[i0:iend]].tostring())
+
+        # If the file did not close properly the frame number of the
+        # incomplete frame is still reported
+        bombed = toend and not index.terminated
+        if bombed and index.partial is not None:
+            frame.frame = np.append(index.frame[i0:iend],
+                                    np.int32(index.partial))
+        else:
+            frame.frame = np.array(index.frame[i0:iend])
 
-        fid.close()
+        if bombed:
+            msg = 'Failed loading file on frame %i.'%frame.frame[-1]
+            msg += ' (stopped reading file)'
+            warnings.warn(msg, RuntimeWarning)
 
-        # We made it through the daq file.
         # Now it is time to do some bookkeeping.
-        frame.frame = np.array(frame.frame)
-        self.f0 = f0 = frame.frame[0]
-        self.fend = fend = frame.frame[-1]
+        self.f0 = frame.frame[0]
+        self.fend = frame.frame[-1]
 
         # If we bombed unpacking a frame we need to make sure
         # everything is aligned before we intialize Elements
+        n = len(frame.frame)
         if bombed:
             # we will strip off the last frame just to make sure
             # everything is kosher
-            n = min(len(frame.code),len(frame.frame),len(frame.count))-1
+            n = len(frame.frame) - 1
             frame.code = frame.code[:n]
             frame.frame = frame.frame[:n]
             frame.count = frame.count[:n]
-            
-            for name in tmpdata:
-                if name.endswith('_Frames'):
-                    continue
-
-                val = tmpdata[name]
-                i = _elemid_lookup[name]
-                if _header.rate[i] != 1:
-                    # CSSDC measures should always be okay. If they have 1
-                    # value they use read, if they have multiple values they
-                    # use fromfile. In either case if the unpacking fails
-                    # nothing will get appended to tmpdata and it will exit
-                    # before appending to the cooresponding _Frames array.
-                    #
-                    # At least that is what my mental interpreter thinks.
-                    # we will assert just to be on the safe side.
-                    assert len(tmpdata[name]) == len(tmpdata[name+'_Frames'])
-                    
-                else:
-                    tmpdata[name] = np.array(tmpdata[name][:n], ndmin=2)
-                    
-                    # gets transposed in next for loop if numvalues > 1
-                    if _header.numvalues[i] > 1:
-                        assert tmpdata[name].shape[0] == frame.frame.shape[0]
-                    else:
-                        assert tmpdata[name].shape[1] == frame.frame.shape[0]
 
-        # cast as Element objects
-        # 'varrateflag' variables remain lists of lists
-        #
-        # There are obvious more compact ways to write this but I'm
-        # paranoid about reference counting and garbage collection not
-        # functioning properly
-        for name, i, rate in zip(_header.name, _header.id, _header.rate):
-            if elemlist is not None:
-                if not any(fnmatch(name, wc) for wc in elemlist):
-                    continue
-            
-            # transpose Element with more than 1 row                
-            if _header.numvalues[i] > 1:
-                tmpdata[name] = np.array(tmpdata[name]).transpose()
-            
-            if rate != 1:
-                self[name] = \
-                    Element(tmpdata[name],
-                            tmpdata[name+'_Frames'],
-                            rate=_header.rate[i],
-                            name=_header.name[i],
-                            dtype=_header.type[i],
-                            varrateflag=_header.varrateflag[i],
-                            elemid=_header.id[i],
-                            units=_header.units[i])
-                
-                del tmpdata[name+'_Frames']
-            else:
-                self[name] = \
-                    Element(tmpdata[name],
-                            frame.frame[:],
-                            rate=_header.rate[i],
-                            name=_header.name[i],
-                            dtype=_header.type[i],
-                            varrateflag=_header.varrateflag[i],
-                            elemid=_header.id[i],
-                            units=_header.units[i])
-
-                # delete tmpdata arrays as we go to save memory
-                del tmpdata[name]
-        
-        del _header, self._header
-        self._header = None
-                    
+        return bombed, n
 
-    def _interpolate_missing_frames(self):
+                    
+    def _interpolate_missing_frames(self, ffill=False):
         """
         interpolates over missing frames for non-CSSDC measures
 
-        Excludes elements that wildcard match:
+        The gaps are found once from self.frame.frame. Every row of an
+        Element is filled at once and the Elements keep their dtype
+        (integers are rounded). Filled Elements share a read-only
+        boolean elem.interpolated mask that is True for the samples that
+        were not recorded.
+
+        Parameters
+        ----------
+        ffill : bool
+            False -> categorical cells are left with their own frames
+            True -> categorical and integer cells are forward filled
+                    (the last recorded value is held over the gap)
+
+        Categorical cells are character cells and elements that wildcard
+        match:
         
             CIS_Auxiliary_Buttons
             SCC_Collision*
@@ -537,33 +1371,77 @@ class Daq(dict):
         """
         global interpolation_wclist
         f0, fend = self.f0, self.fend
-        old_frames = self.frame.frame[:]
+        old_frames = np.asarray(self.frame.frame)
         new_frames = np.linspace(f0, fend, fend - f0 + 1)
         
-        # np.interp can only handle 1-d arrays
+        exclude = ElemSelection.compile(interpolation_wclist)
+
+        # gap structure: where the recorded frames go on the new frame
+        # axis and the recorded neighbours (lo, hi) and weights (w) of
+        # the missing frames
+        keep = (old_frames - f0).astype(np.intp)
+        interpolated = np.ones(len(new_frames), dtype=bool)
+        interpolated[keep] = False
+        interpolated.flags.writeable = False
+        missing = np.flatnonzero(interpolated)
+
+        lo = np.searchsorted(old_frames, new_frames[missing], side='right')-1
+        lo = np.clip(lo, 0, len(old_frames) - 1)
+        hi = np.minimum(lo + 1, len(old_frames) - 1)
+        span = (old_frames[hi] - old_frames[lo]).astype(np.float64)
+        w = (new_frames[missing] - old_frames[lo])/np.where(span > 0, span, 1.)
+        w = np.clip(w, 0., 1.)
+
+        # the filled Elements share the new frame axis
+        axis = FrameAxis(new_frames)
+
         for elem in self.values():
             if elem.isCSSDC():
                 continue
 
-            if any(fnmatch(elem.name, wc) for wc in interpolation_wclist):
+            categorical = elem.type == 'c' or exclude.match(elem.name)
+
+            if isinstance(elem, RaggedElement) or \
+               (categorical and not ffill):
                 # The 'SCC_DynObj*' cells are non-CSSDC but contain
                 # categorical data so we don't want to interpolate it.
                 #
                 # All we really have to do is tell Daq to treat it as
                 # a non-CSSDC measures. When it gets exported the
                 # frames will go with it as SCC_DynObj*_Frames
+                #
+                # Ragged samples can't be interpolated either
                 self[elem.name].rate = -2
                 continue
 
-            x = [np.interp(new_frames, old_frames, elem[j,:])
-                 for j in xrange(elem.numvalues)]
-        
-            self[elem.name] = \
-                Element(x, new_frames,
+            integer = elem.type in 'ih'
+            data = np.empty((elem.numvalues, len(new_frames)),
+                            dtype=elem.nptype)
+            x = np.asarray(elem)
+            data[:, keep] = x
+
+            if categorical or (integer and ffill):
+                # hold the last recorded value
+                data[:, missing] = x[:, lo]
+            else:
+                a = x[:, lo].astype(np.float64)
+                b = x[:, hi].astype(np.float64)
+                a += (b - a)*w
+                if integer:
+                    a = np.rint(a)
+                data[:, missing] = a
+
+            elem = \
+                Element(data, axis,
+                        copy=False,
                         rate=elem.rate,
+                        name=elem.name,
+                        dtype=elem.type,
                         varrateflag=elem.varrateflag,
                         elemid=elem.id,
                         units=elem.units)
+            elem.interpolated = interpolated
+            self[elem.name] = elem
 
         self.frame.frame = new_frames
 
@@ -606,20 +1484,129 @@ class Daq(dict):
                         frame_indiceses[cved] = array('i', [i])
                         row_indiceses[cved] = array('i', [j])
 
+        # the names are unpacked at once from the first frame each
+        # dynamic object is present
+        cvedIds = list(frame_indiceses.keys())
+        names = []
+        if 'SCC_DynObj_Name' in self and len(cvedIds) > 0:
+            cols = [frame_indiceses[cvedId][0] for cvedId in cvedIds]
+            rows = [row_indiceses[cvedId][0] for cvedId in cvedIds]
+            table = _name_table(self['SCC_DynObj_Name'][:, cols])
+            names = list(table[rows, np.arange(len(cols))])
+
         self.dynobjs = OrderedDict()
-        for cvedId in frame_indiceses.keys():
+        for k, cvedId in enumerate(cvedIds):
             do = DynObj()
             do.process(cvedId,
                        np.array(frame_indiceses[cvedId]),
                        np.array(row_indiceses[cvedId]),
-                       self)
+                       self,
+                       name=(names[k] if names else None))
             self.dynobjs[do.name] = do
             
         del frame_indiceses
         del row_indiceses
         
+    def __missing__(self, name):
+        # Elements registered in self._loaders are only materialised
+        # the first time they are accessed
+        if name not in self._loaders:
+            raise KeyError(name)
+
+        elem = self._loaders[name]()
+        dict.__setitem__(self, name, elem)
+        if self._lru is not None:
+            self._cache(name, elem)
+        return elem
+
+    def __getitem__(self, name):
+        elem = dict.__getitem__(self, name)
+
+        # mark as most recently used
+        if self._lru is not None and name in self._lru:
+            self._lru[name] = self._lru.pop(name)
+        return elem
+
+    def _cache(self, name, elem):
+        """
+        adds a materialised Element to the LRU cache and drops the
+        least recently used Elements that don't fit in the budget
+        (they are read again by __missing__ if they are accessed)
+        """
+        self._lru[name] = elem.nbytes
+        self._lru_bytes += elem.nbytes
+
+        if self._lru_budget is None:
+            return
+
+        while self._lru_bytes > self._lru_budget and len(self._lru) > 1:
+            old, nbytes = self._lru.popitem(last=False)
+            self._lru_bytes -= nbytes
+            if dict.__contains__(self, old):
+                dict.__delitem__(self, old)
+            self._monotone.pop(old, None)
+
+    def _uncache(self, name):
+        """
+        removes name from the LRU cache
+        """
+        if self._lru is not None and name in self._lru:
+            self._lru_bytes -= self._lru.pop(name)
+
+    def __contains__(self, name):
+        return dict.__contains__(self, name) or name in self._loaders
+
+    has_key = __contains__
+
+    def __len__(self):
+        if not self._loaders:
+            return dict.__len__(self)
+        return len(self.keys())
+
+    def __iter__(self):
+        if not self._loaders:
+            return dict.__iter__(self)
+        return iter(self.keys())
+
+    def __delitem__(self, name):
+        if not dict.__contains__(self, name) and name not in self._loaders:
+            raise KeyError(name)
+
+        if dict.__contains__(self, name):
+            dict.__delitem__(self, name)
+        self._loaders.pop(name, None)
+        self._uncache(name)
+        self._monotone.pop(name, None)
+
+    def keys(self):
+        keys = dict.keys(self)
+        if self._loaders:
+            keys.extend(k for k in self._loaders
+                        if not dict.__contains__(self, k))
+        return keys
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def itervalues(self):
+        return (self[k] for k in self.keys())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def iteritems(self):
+        return ((k, self[k]) for k in self.keys())
+
+    def get(self, name, default=None):
+        if name in self:
+            return self[name]
+        return default
+
     def __setitem__(self, name, elem):
-        if not isinstance(elem, Element):
+        if not isinstance(elem, (Element, RaggedElement)):
             raise(TypeError, 'Value must be Element')
             
         if name is None and elem.name is not None:
@@ -636,6 +1623,12 @@ class Daq(dict):
         if name is None:
             msg = "name cannot be None"
             raise(KeyError, msg)
+
+        # Elements that are set are never evicted
+        if self._lru is not None:
+            self._uncache(name)
+            self._loaders.pop(name, None)
+        self._monotone.pop(name, None)
         
         dict.__setitem__(self, name, elem)
         
@@ -667,7 +1660,7 @@ class Daq(dict):
 
         self['SCC_Spline_Lane_Deviation_Fixed'] = \
             Element(fixed_lane_dev,
-                    self.frame.frame[:],
+                    lane_dev.frames,
                     name=lane_dev.name+'_Fixed',
                     elemid=lane_dev.id,
                     rate=lane_dev.rate,
@@ -752,7 +1745,166 @@ class Daq(dict):
             raise ValueError('You are trying to open a .daq as .hd5')
         
         root = h5py.File(filename, 'r')
+        _header, i0, iend, interpolated = \
+            self._read_hd5_meta(root, f0, fend)
+            
+        # data
+        # Procedure is similar to read_daq. Data is unpacked
+        # to tmpdata dict and then the Elements are instantiated.
+        _elemid_lookup = dict(zip(_header.name, _header.id))
+        
+        selection = ElemSelection.compile(self.elemlist)
 
+        tmpdata, filled, cssdc_range = {}, set(), {}
+        for k, v in root['data'].iteritems():
+            
+            # the offsets are read with the values they belong to
+            if k.endswith('_Offsets') or not selection.match(k):
+                continue
+                
+            i = _elemid_lookup[k.replace('_Frames','')]
+            
+            # ragged (varrateflag) values are stored flat next to an
+            # _Offsets dataset (see RaggedElement)
+            ragged = k + '_Offsets' in root['data']
+
+            if _header.rate[i] == 1 and not ragged:
+                tmpdata[k] = v[:,i0:iend]
+
+                if v.attrs.get('interpolated', 0):
+                    filled.add(k)
+                
+            elif _header.rate[i] == 1:
+                tmpdata[k] = _read_ragged(v, root['data/%s_Offsets'%k],
+                                          i0, iend)
+
+            else: #CSSDC measure
+                # Need to find indices. The values and the _Frames
+                # of a measure share them.
+                _name = k.replace('_Frames','')
+                if _name not in cssdc_range:
+                    _i0, _iend = 0, None
+                    if f0 is not None or fend is not None:
+                        _i0, _iend = \
+                            _hd5_frame_range(root['data/%s_Frames'%_name],
+                                             f0, fend)
+                    cssdc_range[_name] = (_i0, _iend)
+                _i0, _iend = cssdc_range[_name]
+
+                # Now we can slice the data
+                if ragged:
+                    tmpdata[k] = _read_ragged(v, root['data/%s_Offsets'%k],
+                                              _i0, _iend)
+                elif len(v.shape) == 1:
+                    tmpdata[k] = np.array(v[_i0:_iend], ndmin=2) # _Frames
+                else:
+                    tmpdata[k] = v[:,_i0:_iend]
+
+        root.close()
+
+        # the non-CSSDC Elements share one frame axis
+        axis = FrameAxis(self.frame.frame)
+
+        # cast as Element objects
+        # 'varrateflag' variables become RaggedElements
+        #
+        # There are obvious more compact ways to write this but I'm
+        # paranoid about reference counting and garbage collection not
+        # functioning properly
+        for name, i in zip(_header.name, _header.id):
+            self[name] = _hd5_cast(i, tmpdata, _header, axis)
+
+            if name in filled:
+                self[name].interpolated = interpolated
+                
+        del _header
+
+    def open_hd5(self, filename, lazy=True, max_memory=None):
+        """
+        open_hd5(filename[, lazy=True][, max_memory=None])
+
+        Opens a HDF5 container written by write_hd5. With lazy=True
+        only the metadata is read. Each Element is read from the file
+        the first time it is accessed and the file stays open until
+        close is called (or the Daq is garbage collected).
+
+        The materialised Elements are kept in a least recently used
+        cache. When max_memory is exceeded the least recently used
+        Elements are dropped from the Daq and read again if they are
+        accessed later.
+
+        Parameters
+        ----------
+        filename : string
+            file to open
+
+        lazy : bool
+            True -> read Elements when they are first accessed
+            False -> same as read_hd5
+
+        max_memory : None, int or string
+            None -> keep every Element that has been read
+            int or string -> byte budget of the cached Elements
+            (e.g. 200000000 or '200MB')
+
+        Return
+        ------
+        None
+
+        Example
+        -------
+        >>> daq = Daq()
+        >>> daq.open_hd5('drive01.hdf5', max_memory='500MB')
+        >>> spd = daq['VDS_Veh_Speed']  # read now
+        """
+        if not lazy:
+            self.read_hd5(filename)
+            return
+
+        if filename.endswith('daq'):
+            raise ValueError('You are trying to open a .daq as .hd5')
+
+        self.close()
+        self._hd5 = root = h5py.File(filename, 'r')
+        _header, i0, iend, interpolated = self._read_hd5_meta(root)
+
+        self._lru = OrderedDict()
+        self._lru_budget = None
+        if max_memory is not None:
+            self._lru_budget = _parse_bytes(max_memory)
+
+        axis = FrameAxis(self.frame.frame)
+        self._loaders = {}
+        for name, i in zip(_header.name, _header.id):
+            self._loaders[name] = \
+                partial(_hd5_element, root, _header, i, axis, interpolated)
+
+    def close(self):
+        """
+        closes the HDF5 file opened by open_hd5. The Elements that
+        have not been read are no longer available.
+        """
+        if self._hd5 is not None:
+            self._loaders = {}
+            self._hd5.close()
+            self._hd5 = None
+
+        self._lru = None
+
+    def _read_hd5_meta(self, root, f0=None, fend=None):
+        """
+        reads everything but the data of an open HDF5 container
+
+        Returns
+        -------
+        _header : Header
+
+        i0, iend : None or int
+            indices of f0 and fend in the frames of the file
+
+        interpolated : None or np.array
+            mask of the frames filled in by _interpolate_missing_frames
+        """
         # info
         self.info = \
             Info(run = root['info'].attrs['run'], 
@@ -798,20 +1950,13 @@ class Daq(dict):
         # For the CSSDC elements we will have to find the
         # appropriate indices as we go.
         i0, iend = None, None
-    
-        try:
-            all_frames = root['frame/frame'][:]
-        except:
-            all_frames = None
-
-        if all_frames is not None:
-            if f0 is not None or fend is not None:
-                if f0 is not None:
-                    i0 = _searchsorted(all_frames, f0)
-                if fend is not None:
-                    iend = _searchsorted(all_frames, fend)
-                    if iend < len(all_frames):
-                        iend += 1
+
+        # the frame metadata written by write_hd5 locates the frames
+        # without reading all of them (see _hd5_frame_range)
+        if 'frame/frame' in root and (f0 is not None or fend is not None):
+            i0, iend = _hd5_frame_range(root['frame/frame'], f0, fend)
+            i0 = (i0, None)[f0 is None]
+            iend = (iend, None)[fend is None]
                     
         indx = slice(i0,iend)
 
@@ -827,51 +1972,19 @@ class Daq(dict):
                       frame = array('i'),
                       count = array('i'))
 
+        # frames filled in by _interpolate_missing_frames
+        try:
+            interpolated = root['frame/interpolated'][indx]
+            interpolated.flags.writeable = False
+        except:
+            interpolated = None
+
         # elemlist
         try:
             # Fails if slice is zero-length
             self.elemlist = root['elemlist'][:] 
         except:
             self.elemlist = None
-            
-        # data
-        # Procedure is similar to read_daq. Data is unpacked
-        # to tmpdata dict and then the Elements are instantiated.
-        _elemid_lookup = dict(zip(_header.name, _header.id))
-        
-        tmpdata = {}
-        for k, v in root['data'].iteritems():
-            
-            if self.elemlist is not None:
-               if not any(fnmatch(k, wc) for wc in self.elemlist):
-                   continue
-                
-            i = _elemid_lookup[k.replace('_Frames','')]
-            
-            if _header.rate[i] == 1:
-                tmpdata[k] = v[:,i0:iend]
-                
-            else: #CSSDC measure
-                if len(v.shape) == 1:
-                    v = np.array(v, ndmin=2) # _Frames
-                    
-                # Need to find indices
-                _i0 = 0
-                _iend= v.shape[1]
-
-                if f0 is not None or fend is not None:
-                    _name = k.replace('_Frames','')
-                    _all_frames = root['data/%s_Frames'%_name][:].flatten()
-
-                    if f0 is not None:
-                        _i0 = _searchsorted(_all_frames, f0)
-                    if fend is not None:
-                        _iend = _searchsorted(_all_frames, fend)
-                        if _iend < len(_all_frames):
-                            _iend += 1
-
-                # Now we can slice the data
-                tmpdata[k] = v[:,_i0:_iend]
 
         # hdf5 doesn't have a None type (or atleast, I don't know how
         # to use it) so None is stored as an empty string in the hdf5 file
@@ -890,57 +2003,50 @@ class Daq(dict):
         self.etc = {}  
         for (name, obj) in root['etc'].attrs.iteritems():
             self.etc[name] = _literal_eval(obj)
-            
-        root.close()
 
-        # cast as Element objects
-        # 'varrateflag' variables remain lists of lists
-        #
-        # There are obvious more compact ways to write this but I'm
-        # paranoid about reference counting and garbage collection not
-        # functioning properly
-        for name, i, rate in zip(_header.name, _header.id, _header.rate):
-            if rate != 1:
-                self[name] = \
-                    Element(tmpdata[name],
-                            tmpdata[name+'_Frames'].flatten(),
-                            rate=_header.rate[i],
-                            name=_header.name[i],
-                            dtype=_header.type[i],
-                            varrateflag=_header.varrateflag[i],
-                            elemid=_header.id[i],
-                            units=_header.units[i])
-                
-                del tmpdata[name+'_Frames']
-            else:
-                self[name] = \
-                    Element(tmpdata[name],
-                            self.frame.frame[:],
-                            rate=_header.rate[i],
-                            name=_header.name[i],
-                            dtype=_header.type[i],
-                            varrateflag=_header.varrateflag[i],
-                            elemid=_header.id[i],
-                            units=_header.units[i])
-                            
-                # delete tmpdata arrays as we go to save memory
-                del tmpdata[name]
-                
-        del _header
-        
+        return _header, i0, iend, interpolated
 
-    def write_hd5(self, filename=None):
+    def write_hd5(self, filename=None, compression='gzip',
+                  compression_opts=4, shuffle=True, chunk_frames=3600,
+                  cssdc_chunk=1024):
         """
-        write_hd5(filename=None)
+        write_hd5(filename=None[, compression='gzip'][, compression_opts=4]
+                  [, shuffle=True][, chunk_frames=3600][, cssdc_chunk=1024])
         
         writes Daq object to HDF5 container
 
+        The frame data is chunked along the frames so reading a frame
+        range with read_hd5 only reads (and decompresses) the chunks
+        that hold it. The layout is stored in the attributes of the
+        'data' group.
+
         Parameters
         ----------
         filename : None or string (optional)
             None : file written to daq.filename.replace('.daq', '.hdf5')
             string : specify output file (will overwrite)
 
+        compression : None or string
+            None -> data is not compressed
+            'gzip' -> portable, good compression
+            'lzf' -> faster, less compression (h5py only)
+
+        compression_opts : int
+            gzip compression level (0-9)
+
+        shuffle : bool
+            apply the shuffle filter before compressing (usually helps
+            the compression of numeric data)
+
+        chunk_frames : None or int
+            None -> datasets are contiguous unless compressed (then
+            h5py picks the chunks)
+            int -> frames per chunk of the non-CSSDC datasets (3600 is
+            one minute at 60 Hz)
+
+        cssdc_chunk : None or int
+            samples per chunk of the CSSDC datasets and their _Frames
+
         Return
         ------
         None
@@ -949,6 +2055,14 @@ class Daq(dict):
         frame = self.frame
         _header = self._rebuild_header()
         str_type = h5py.new_vlen(str)
+
+        filters = {}
+        if compression is not None:
+            filters['compression'] = compression
+            if compression == 'gzip':
+                filters['compression_opts'] = compression_opts
+            filters['shuffle'] = bool(shuffle)
+        create = partial(_create_dataset, **filters)
         
         if filename is None:
             filename = info.filename[:-4] + '.hdf5'
@@ -974,9 +2088,10 @@ class Daq(dict):
 
         # frame
         root.create_group('frame')
-        root['frame'].create_dataset('frame', data=frame.frame)
-        root['frame'].create_dataset('count', data=frame.count)
-        root['frame'].create_dataset('code', data=frame.code)
+        ds = create(root['frame'], 'frame', frame.frame, chunk_frames)
+        _write_frame_attrs(ds, frame.frame, chunk_frames)
+        create(root['frame'], 'count', frame.count, chunk_frames)
+        create(root['frame'], 'code', frame.code, chunk_frames)
 
         # header
         root.create_group('header')        
@@ -995,11 +2110,41 @@ class Daq(dict):
         # data
         root.create_group('data')
         for name, elem in self.items():
-            root['data'].create_dataset(name, data=elem.toarray())
+            chunk = (chunk_frames, cssdc_chunk)[elem.isCSSDC()]
+
+            if isinstance(elem, RaggedElement):
+                # flat values and the offsets of the frames. The values
+                # are chunked by the mean number of values per frame.
+                vchunk = chunk
+                if chunk is not None and len(elem) > 0:
+                    vchunk = int(round(chunk*len(elem.values)/
+                                       float(len(elem))))
+
+                create(root['data'], name, elem.values, vchunk)
+                create(root['data'], name+'_Offsets', elem.offsets, chunk)
+            else:
+                ds = create(root['data'], name, elem.toarray(), chunk)
+
+                # the interpolated Elements share one mask of the frames
+                # that were filled in
+                if getattr(elem, 'interpolated', None) is not None:
+                    ds.attrs['interpolated'] = 1
+                    if 'interpolated' not in root['frame']:
+                        create(root['frame'], 'interpolated',
+                               elem.interpolated, chunk_frames)
 
             if elem.isCSSDC():
-                root['data'].create_dataset(name+'_Frames',
-                                            data=elem.frames)
+                ds = create(root['data'], name+'_Frames', elem.frames, chunk)
+                _write_frame_attrs(ds, elem.frames, chunk)
+
+        # layout (None is stored as an empty string)
+        layout = root['data'].attrs
+        layout['compression'] = (compression, '')[compression is None]
+        layout['compression_opts'] = \
+            (compression_opts, '')['compression_opts' not in filters]
+        layout['shuffle'] = int(filters.get('shuffle', False))
+        layout['chunk_frames'] = (chunk_frames, '')[chunk_frames is None]
+        layout['cssdc_chunk'] = (cssdc_chunk, '')[cssdc_chunk is None]
         # misc
         root.create_dataset('elemlist',
                             data=np.array(self.elemlist, dtype=str_type))
@@ -1064,7 +2209,13 @@ class Daq(dict):
         # data
         data = {}        
         for name in self:
-            data[name] = np.array(self[name], order='F').transpose()
+            if isinstance(self[name], RaggedElement):
+                # ragged samples are exported as a cell array
+                data[name] = np.empty((len(self[name]), 1), dtype=object)
+                for k, values in enumerate(self[name]):
+                    data[name][k, 0] = values
+            else:
+                data[name] = np.array(self[name], order='F').transpose()
 
             if self[name].isCSSDC():
                 data[name+'_Frames'] = np.array(self[name].frames, order='F')
@@ -1227,6 +2378,210 @@ class Daq(dict):
         
         return fig
         
+    def tslice(self, *args):
+        """
+        tslice([t0,] t1)
+
+        returns the FrameSlice of the frames recorded from t0 up to (but
+        not including) t1 seconds. Time is the frame number scaled by
+        info.frequency (the same time axis as plot_ts), so the frames
+        are found arithmetically.
+
+        Parameters
+        ----------
+        t0 : float or None, optional
+            start time in seconds
+
+        t1 : float or None
+            stop time in seconds
+
+        Returns
+        -------
+        fs : FrameSlice
+            for indexing Elements (e.g. daq['VDS_Veh_Speed'][0, fs])
+
+        Example
+        -------
+        >>> spd = daq['VDS_Veh_Speed'][0, daq.tslice(60., 120.)]
+        """
+        t0, t1 = _range_args(args)
+        fs = float(self.info.frequency)
+        if fs <= 0:
+            raise ValueError('info.frequency must be positive')
+
+        def _frame(t):
+            # first frame at or after t
+            if t is None:
+                return None
+            return int(np.ceil(round(t*fs, 6)))
+
+        return FrameSlice(_frame(t0), _frame(t1), None)
+
+    def dslice(self, *args, **kwds):
+        """
+        dslice([d0,] d1[, name='VDS_Veh_Dist'])
+
+        returns the FrameSlice of the frames from where the distance
+        travelled first reaches d0 up to where it first reaches d1.
+
+        The distance is made monotone with a running maximum (so
+        stopping or backing up doesn't split the window). The running
+        maximum is cached on the Daq and rebuilt only if the distance
+        Element is replaced, so each call is a binary search.
+
+        Parameters
+        ----------
+        d0 : float or None, optional
+            start distance
+
+        d1 : float or None
+            stop distance
+
+        name : string
+            distance Element (first row is used)
+
+        Returns
+        -------
+        fs : FrameSlice
+            for indexing Elements (e.g. daq['VDS_Veh_Speed'][0, fs])
+
+        Example
+        -------
+        >>> spd = daq['VDS_Veh_Speed'][0, daq.dslice(1000., 2000.)]
+        """
+        name = kwds.pop('name', 'VDS_Veh_Dist')
+        if kwds:
+            raise TypeError('unexpected keyword argument %r'%kwds.keys()[0])
+
+        d0, d1 = _range_args(args)
+        frames, dist = self._monotone_index(name)
+
+        def _frame(d):
+            if d is None:
+                return None
+            i = np.searchsorted(dist, d)
+            if i == len(frames):
+                return int(frames[-1]) + 1
+            return int(frames[i])
+
+        return FrameSlice(_frame(d0), _frame(d1), None)
+
+    def _monotone_index(self, name):
+        """
+        returns the frames and running maximum of the first row of the
+        Element name (cached until the Element is replaced or evicted)
+
+        Only a weak reference to the Element is kept so the cache
+        doesn't hold on to Elements evicted by open_hd5
+        """
+        elem = self[name]
+        cached = self._monotone.get(name)
+        if cached is not None and cached[0]() is elem:
+            return elem.frames, cached[1]
+
+        x = np.asarray(elem.values[0] if elem.ndim == 2 else elem.values,
+                       dtype=np.float64)
+        x = np.where(np.isnan(x), -np.inf, x)
+        index = np.maximum.accumulate(x)
+        index.flags.writeable = False
+
+        self._monotone[name] = (weakref.ref(elem), index)
+        return elem.frames, index
+
+    def to_matrix(self, names_with_rows, fs=None, dtype=np.float64,
+                  fill=np.nan):
+        """
+        to_matrix(names_with_rows[, fs=None][, dtype=np.float64]
+                  [, fill=np.nan])
+
+        returns the rows of several Elements as the columns of one
+        array aligned on the frames of the Daq. CSSDC measures are
+        expanded to every frame with a zero order hold (the last state
+        at or before each frame). The values are copied straight into
+        the output without building intermediate Elements.
+
+        Parameters
+        ----------
+        names_with_rows : list of tuples
+            (name, rows) pairs (like the elem_pars of plot_ts)
+            rows -> None (all rows), int, slice or list of ints
+
+        fs : None or FrameSlice
+            None -> all the frames
+            FrameSlice -> frames to extract (see fslice, tslice and
+            dslice)
+
+        dtype : np.dtype
+            type of the output
+
+        fill : scalar
+            value of CSSDC measures before their first sample
+
+        Returns
+        -------
+        x : np.ndarray
+            (frames x columns) Fortran ordered array (each column is
+            contiguous)
+
+        columns : list of tuples
+            (name, row) of each column of x
+
+        Example
+        -------
+        >>> x, columns = daq.to_matrix([('VDS_Veh_Speed', 0),
+        ...                             ('VDS_Chassis_CG_Position', None),
+        ...                             ('SCC_Lane_Deviation', 1)],
+        ...                            daq.tslice(60., 120.))
+        """
+        frames = np.asarray(self.frame.frame)
+        if fs is None:
+            fs = FrameSlice(None, None, None)
+
+        i0 = iend = None
+        if fs.start is not None:
+            i0 = _frame_search(frames, fs.start)
+        if fs.stop is not None:
+            iend = _frame_search(frames, fs.stop)
+        indx = slice(i0, iend, fs.step)
+        grid = frames[indx]
+
+        # resolve the columns first so the output is allocated once
+        blocks, columns = [], []
+        for name, rows in names_with_rows:
+            elem = self[name]
+            if isinstance(elem, RaggedElement):
+                raise TypeError("'%s' is a RaggedElement"%name)
+
+            if rows is None:
+                rows = slice(None)
+            rows = np.atleast_1d(np.arange(elem.shape[0])[rows])
+            blocks.append((elem, rows))
+            columns.extend((name, int(r)) for r in rows)
+
+        x = np.empty((len(grid), len(columns)), dtype=dtype, order='F')
+
+        j = 0
+        for elem, rows in blocks:
+            values = elem.values
+
+            if not elem.isCSSDC() and len(elem.frames) == len(frames):
+                # on the frame axis of the Daq
+                for r in rows:
+                    x[:, j] = values[r, indx]
+                    j += 1
+                continue
+
+            # zero order hold
+            k = _frame_search(elem.frames, grid, side='right') - 1
+            before = k < 0
+            k[before] = 0
+            for r in rows:
+                x[:, j] = values[r].take(k)
+                x[before, j] = fill
+                j += 1
+
+        return x, columns
+
     def match_keys(self, wc):
         """
         Returns a list of keys (element names) that match 
@@ -1283,7 +2638,7 @@ class Daq(dict):
         
         for name in sorted(names):
             elem = self[name]
-            if elem.isCSSDC():
+            if elem.isCSSDC() or isinstance(elem, RaggedElement):
                 continue
             
             print(name.ljust(ncol),
@@ -1294,3 +2649,101 @@ class Daq(dict):
 
             
                   
+
+def iter_daq(filename, elemlist=None, chunk_frames=3600):
+    """
+    iter_daq(filename[, elemlist=None][, chunk_frames=3600])
+
+    iterates over a .daq file in chunks of frames without reading the
+    whole file into memory
+
+    Each chunk is a Daq holding chunk_frames frames with its own frame
+    record and aligned Elements. CSSDC Elements also carry the last state
+    recorded before the chunk so their values are defined from the start
+    of the chunk. Only one chunk is unpacked at a time.
+
+    Dynamic objects are not processed, missing frames are not
+    interpolated and the lane deviation is not unwrapped.
+
+    Parameters
+    ----------
+    filename : string
+        path to .daq file
+
+    elemlist : None or list_like
+         None -> load all elements
+         list_like -> load names that match list
+
+    chunk_frames : int
+        number of frames in each chunk
+
+    Returns
+    -------
+    generator of Daq instances
+
+    Example
+    -------
+    >>> from undaqTools import iter_daq
+    >>> for chunk in iter_daq('drive01.daq', ['VDS_Veh_Speed']):
+    ...     print(chunk.f0, chunk.fend, chunk['VDS_Veh_Speed'].max())
+    """
+    if chunk_frames < 1:
+        raise ValueError('chunk_frames must be a positive integer')
+
+    daq = Daq()
+    daq.read_daq(filename, elemlist=elemlist, loaddata=False)
+
+    _header = daq._header
+    mask = daq._elemlist_mask(_header)
+    index = daq._get_index(_header)
+
+    buf = np.memmap(daq.info.filename, dtype=np.uint8, mode='r')
+    buf = buf.view(np.ndarray)
+
+    # last state of the CSSDC elements (name -> (values, frames))
+    state = {}
+
+    for i0 in xrange(0, len(index), chunk_frames):
+        iend = min(i0 + chunk_frames, len(index))
+
+        chunk = Daq()
+        chunk.info = daq.info
+        chunk.elemlist = daq.elemlist
+        chunk.cursor = daq.cursor
+
+        tmpdata = _decode_frames(buf, index, _header, mask, i0, iend)
+
+        for name, i, rate in zip(_header.name, _header.id, _header.rate):
+            if not mask[i] or rate == 1:
+                continue
+
+            values, frames = tmpdata[name], tmpdata[name+'_Frames']
+            last = state.get(name)
+            
+            # the state is copied so it doesn't keep the whole chunk
+            # (or the map it was read from) alive
+            if len(frames) > 0:
+                # varrateflag elements hold a list with one entry per frame
+                if _header.varrateflag[i]:
+                    state[name] = ([np.array(values[-1], copy=True)],
+                                   frames[-1:].copy())
+                else:
+                    state[name] = (values[:, -1:].copy(),
+                                   frames[-1:].copy())
+
+            if last is not None:
+                tmpdata[name] = _join_blocks([last[0], values])
+                tmpdata[name+'_Frames'] = _join_blocks([last[1], frames])
+
+        bombed, n = chunk._frame_from_index(index, i0, iend)
+
+        axis = FrameAxis(chunk.frame.frame)
+        for name, i in zip(_header.name, _header.id):
+            if mask[i]:
+                chunk[name] = _cast_element(i, tmpdata, _header,
+                                            axis, bombed, n)
+
+        del tmpdata
+        yield chunk
+
+    del buf
@@ -0,0 +1,620 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import os
+
+from struct import unpack_from, pack, unpack, calcsize
+from struct import error as StructError
+
+import numpy as np
+
+# .daqidx sidecar layout
+#
+#   fixed size preamble (_preamble_fmt)
+#   offsets     int64[nframes + 1]
+#   frame       int32[nframes]
+#   code        int32[nframes]
+#   layout      int32[nframes]
+#   layout_lens int32[nlayouts]
+#   layout_ids  int32[sum(layout_lens)]
+#   counts      int64[numentries]
+#   numitems    int64[numentries]
+_magic = 'DAQIDX01'
+_preamble_fmt = '<8sqdqqiiiii'
+_preamble_size = calcsize(_preamble_fmt)
+
+# number of bytes the boundary scan views at a time
+_scan_chunk = 1 << 24
+
+def sidecar(filename):
+    """
+    returns the path of the .daqidx sidecar belonging to a .daq file
+    """
+    return os.path.splitext(filename)[0] + '.daqidx'
+
+def _replace(src, dst):
+    """
+    renames src to dst, replacing dst if it exists
+    """
+    try:
+        os.rename(src, dst)
+    except OSError:
+        # Windows doesn't rename over existing files
+        if not os.path.exists(dst):
+            raise
+        os.remove(dst)
+        os.rename(src, dst)
+
+def _parse_frame(buf, pos, _header):
+    """
+    parses the frame starting at byte pos of buf one cell at a time
+
+    Returns
+    -------
+    (code, frame, ids, numitems, end) : tuple
+        ids and numitems are lists with an entry for each cell in the
+        frame. end is the byte offset following the frame. If code is -2
+        (end of data) frame, ids and numitems are None.
+
+    Raises struct.error or IndexError when the frame is incomplete
+    """
+    numvalues = _header.numvalues
+    varrateflag = _header.varrateflag
+    nbytes = _header.bytes
+
+    code = unpack_from('i', buf, pos)[0]
+    if code == -2:
+        return code, None, None, None, pos + 4
+
+    frame, count = unpack_from('ii', buf, pos + 4)
+    pos += 12
+
+    ids, numitems = [], []
+    for j in xrange(count):
+        i = unpack_from('i', buf, pos)[0]
+        pos += 4
+
+        if varrateflag[i]:
+            n = unpack_from('i', buf, pos)[0]
+            pos += 4
+        else:
+            n = numvalues[i]
+
+        pos += n*nbytes[i]
+        ids.append(i)
+        numitems.append(n)
+
+    if pos > len(buf):
+        raise StructError('frame extends past the end of the file')
+
+    return code, frame, ids, numitems, pos
+
+def _template_dtype(ids, numitems, _header):
+    """
+    builds a structured dtype describing a frame with the cells ids
+    each holding numitems values.
+
+    Frames sharing a template can be viewed and decoded as one array.
+    The fields are 'code', 'frame', 'count' followed by 'i<j>' (element id),
+    'n<j>' (item count, varrateflag cells only) and 'v<j>' (values)
+    for each cell j in the frame.
+    """
+    fields = [('code', 'i4'), ('frame', 'i4'), ('count', 'i4')]
+    for j, (i, n) in enumerate(zip(ids, numitems)):
+        fields.append(('i%i'%j, 'i4'))
+        if _header.varrateflag[i]:
+            fields.append(('n%i'%j, 'i4'))
+
+        if n == 1:
+            fields.append(('v%i'%j, _header.nptype[i]))
+        else:
+            fields.append(('v%i'%j, _header.nptype[i], (n,)))
+
+    return np.dtype(fields)
+
+def _template_matches(arr, ids, numitems, _header):
+    """
+    returns the number of leading frames in arr (viewed with the template
+    built from ids and numitems) that really have that layout
+    """
+    ok = np.logical_and(arr['count'] == len(ids), arr['code'] != -2)
+    for j, (i, n) in enumerate(zip(ids, numitems)):
+        ok &= arr['i%i'%j] == i
+        if _header.varrateflag[i]:
+            ok &= arr['n%i'%j] == n
+
+    if ok.all():
+        return len(ok)
+    return int(ok.argmin())
+
+class DaqIndex(object):
+    """
+    Byte offset index of the frames in a .daq file
+
+    The index is built with a single pass over the file and can be saved
+    next to the .daq as a .daqidx sidecar so later reads can locate frames
+    without walking the file again.
+
+    Attributes
+    ----------
+    filename : string
+        path to the indexed .daq file
+
+    size : int
+        size of the .daq file in bytes when it was indexed
+
+    mtime : float
+        modification time of the .daq file when it was indexed
+
+    cursor : int
+        byte where the data frames begin
+
+    offsets : np.ndarray (int64)
+        byte offset of every frame. Has one more entry than there are
+        frames, the last entry is the byte following the last complete frame
+
+    frame : np.ndarray (int32)
+        frame number of every frame
+
+    code : np.ndarray (int32)
+        frame code of every frame
+
+    layout : np.ndarray (int32)
+        index into layouts for every frame
+
+    layouts : list of np.ndarray (int32)
+        the distinct element id sequences found in the frames
+
+    counts : np.ndarray (int64)
+        number of frames each element (by id) occurs in
+
+    numitems : np.ndarray (int64)
+        total number of values recorded for each element (by id)
+
+    terminated : bool
+        True if the end of data code (-2) was found
+
+    partial : None or int
+        frame number of an incomplete trailing frame (file did not close
+        properly) or None
+    """
+    def __init__(self):
+        self.filename = ''
+        self.size = 0
+        self.mtime = 0.
+        self.cursor = 0
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.frame = np.zeros(0, dtype=np.int32)
+        self.code = np.zeros(0, dtype=np.int32)
+        self.layout = np.zeros(0, dtype=np.int32)
+        self.layouts = []
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.numitems = np.zeros(0, dtype=np.int64)
+        self.terminated = False
+        self.partial = None
+
+    def __len__(self):
+        return len(self.frame)
+
+    def elemids(self, i):
+        """
+        returns the element ids in the i-th frame
+        """
+        return self.layouts[self.layout[i]]
+
+    def frame_range(self, f0=None, fend=None):
+        """
+        returns the range (i0, iend) of frame indices holding the
+        frames f0 to fend (inclusive)
+        """
+        i0, iend = 0, len(self)
+        if f0 is not None:
+            i0 = int(np.searchsorted(self.frame, f0, 'left'))
+        if fend is not None:
+            iend = int(np.searchsorted(self.frame, fend, 'right'))
+        return i0, max(i0, iend)
+
+    def last_with(self, elemid, i):
+        """
+        returns the index of the last frame before the i-th frame that
+        contains the element elemid or -1 if there isn't one
+        """
+        has = np.array([elemid in ids for ids in self.layouts], dtype=bool)
+        hits = np.flatnonzero(has[self.layout[:i]])
+        if len(hits) == 0:
+            return -1
+        return int(hits[-1])
+
+    def range_counts(self, i0=0, iend=None):
+        """
+        returns the number of frames each element (by id) occurs in
+        among the frames with indices i0 to iend-1
+        """
+        if iend is None:
+            iend = len(self)
+
+        nlayout = np.bincount(self.layout[i0:iend],
+                              minlength=len(self.layouts))
+        counts = np.zeros(len(self.counts), dtype=np.int64)
+        for ids, n in zip(self.layouts, nlayout):
+            if n > 0:
+                np.add.at(counts, ids, n)
+        return counts
+
+    def take(self, i0, iend):
+        """
+        returns a DaqIndex of the frames with indices i0 to iend-1.
+        counts and numitems are not recomputed.
+        """
+        index = DaqIndex()
+        index.filename = self.filename
+        index.size = self.size
+        index.mtime = self.mtime
+        index.cursor = int(self.offsets[i0])
+        index.offsets = self.offsets[i0:iend+1]
+        index.frame = self.frame[i0:iend]
+        index.code = self.code[i0:iend]
+        index.layout = self.layout[i0:iend]
+        index.layouts = self.layouts
+        index.counts = self.counts
+        index.numitems = self.numitems
+        index.terminated = self.terminated and iend == len(self)
+        if iend == len(self):
+            index.partial = self.partial
+        return index
+
+    def split(self, n, i0=0, iend=None):
+        """
+        returns n+1 frame indices splitting frames i0 to iend-1 into n
+        pieces of about the same number of bytes
+        """
+        if iend is None:
+            iend = len(self)
+
+        offsets = self.offsets[i0:iend+1]
+        bounds = np.linspace(offsets[0], offsets[-1], n + 1)
+        splits = np.searchsorted(offsets, bounds) + i0
+        splits[0], splits[-1] = i0, iend
+        return np.unique(splits)
+
+    @classmethod
+    def build(cls, filename, cursor, _header, fend=None):
+        """
+        build(filename, cursor, _header[, fend=None])
+
+        indexes a .daq file with a single pass over its frames
+
+        Frames are parsed one cell at a time until a frame is found. The
+        layout of that frame is then used as a template and as many of the
+        following frames as share the template are validated and indexed
+        at once. Only frames that break the template (e.g. a CSSDC cell
+        appearing) are parsed cell by cell.
+
+        Parameters
+        ----------
+        filename : string
+            path to .daq file
+
+        cursor : int
+            byte where the data frames begin (Daq.cursor)
+
+        _header : Header
+            element header information (Daq._header)
+
+        fend : None or int
+            None -> index the whole file
+            int -> stop after the first frame past this frame. The
+                   index then only covers the beginning of the file and
+                   should not be saved.
+
+        Returns
+        -------
+        index : DaqIndex
+        """
+        st = os.stat(filename)
+        buf = np.memmap(filename, dtype=np.uint8, mode='r').view(np.ndarray)
+
+        offsets, frames, codes, layout = [], [], [], []
+        layout_lookup = {}
+        templates = {}
+        numentries = len(_header.numvalues)
+        numitems = np.zeros(numentries, dtype=np.int64)
+        terminated, partial = False, None
+
+        pos = cursor
+        while 1:
+            try:
+                code, frame, ids, nitems, end = _parse_frame(buf, pos, _header)
+            except (StructError, IndexError):
+                # file did not close properly. Remember the frame number if
+                # the header of the incomplete frame is intact
+                if len(buf) - pos >= 12:
+                    partial = unpack_from('i', buf, pos + 4)[0]
+                break
+
+            if code == -2:
+                terminated = True
+                break
+
+            key = tuple(ids)
+            if key not in layout_lookup:
+                layout_lookup[key] = len(layout_lookup)
+            l = layout_lookup[key]
+
+            offsets.append(np.array([pos], dtype=np.int64))
+            frames.append(np.array([frame], dtype=np.int32))
+            codes.append(np.array([code], dtype=np.int32))
+            layout.append(np.array([l], dtype=np.int32))
+            np.add.at(numitems, ids, nitems)
+            pos = end
+
+            if fend is not None and frame > fend:
+                break
+
+            # now try to skip through the frames sharing this template
+            tkey = (key, tuple(nitems))
+            if tkey not in templates:
+                templates[tkey] = _template_dtype(ids, nitems, _header)
+            dtype = templates[tkey]
+            size = dtype.itemsize
+
+            # runs are often short (CSSDC cells come and go) so the
+            # number of frames checked at once starts small and doubles
+            # while the template keeps matching
+            chunk = 16
+            stop = False
+            while 1:
+                k = min((len(buf) - pos)//size, chunk)
+                chunk = min(2*chunk, max(16, _scan_chunk//size))
+                if k <= 0:
+                    break
+
+                arr = buf[pos:pos + k*size].view(dtype)
+                m = _template_matches(arr, ids, nitems, _header)
+                if m == 0:
+                    break
+
+                if fend is not None:
+                    past = np.flatnonzero(arr['frame'][:m] > fend)
+                    if len(past) > 0:
+                        m, stop = past[0] + 1, True
+
+                offsets.append(pos + size*np.arange(m, dtype=np.int64))
+                frames.append(np.array(arr['frame'][:m], dtype=np.int32))
+                codes.append(np.array(arr['code'][:m], dtype=np.int32))
+                layout.append(np.ones(m, dtype=np.int32)*l)
+                np.add.at(numitems, ids, np.array(nitems, dtype=np.int64)*m)
+                pos += m*size
+
+                if m < k or stop:
+                    break
+
+            if stop:
+                break
+
+        offsets.append(np.array([pos], dtype=np.int64))
+        del buf
+
+        index = cls()
+        index.filename = filename
+        index.size = st.st_size
+        index.mtime = st.st_mtime
+        index.cursor = cursor
+        index.offsets = np.concatenate(offsets)
+        index.frame = np.concatenate(frames or [index.frame])
+        index.code = np.concatenate(codes or [index.code])
+        index.layout = np.concatenate(layout or [index.layout])
+        index.layouts = [np.array(k, dtype=np.int32) for k, v in
+                         sorted(layout_lookup.items(), key=lambda kv: kv[1])]
+        index.numitems = numitems
+        index.terminated = terminated
+        index.partial = partial
+
+        # element occurrence counts follow from how often each layout occurs
+        index.counts = np.zeros(numentries, dtype=np.int64)
+        layout_counts = np.bincount(index.layout, minlength=len(index.layouts))
+        for ids, n in zip(index.layouts, layout_counts):
+            np.add.at(index.counts, ids, n)
+
+        return index
+
+    def isvalid(self, filename=None):
+        """
+        checks whether the index still describes the .daq file
+
+        Parameters
+        ----------
+        filename : None or string
+            None -> check self.filename
+            string -> check this .daq file
+
+        Returns
+        -------
+        answer : bool
+            True if the size and modification time of the file match
+        """
+        if filename is None:
+            filename = self.filename
+
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return False
+
+        return st.st_size == self.size and st.st_mtime == self.mtime
+
+    def write(self, filename=None):
+        """
+        write([filename=None])
+
+        saves the index as a binary sidecar
+
+        Parameters
+        ----------
+        filename : None or string
+            None -> written next to the .daq file with a .daqidx extension
+            string -> specify output file (will overwrite)
+        """
+        if filename is None:
+            filename = sidecar(self.filename)
+
+        if filename.endswith('.daq'):
+            msg = 'Writing DaqIndex with a .daq extension is not allowed'
+            raise ValueError(msg)
+
+        # The sidecar is written to a temporary file that replaces it
+        # when complete, so other processes never read half an index
+        tmp_filename = '%s.%i.tmp'%(filename, os.getpid())
+        try:
+            with open(tmp_filename, 'wb') as fid:
+                self._write(fid)
+            _replace(tmp_filename, filename)
+        except:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+            raise
+
+    def _write(self, fid):
+        """
+        writes the index to the open file fid
+        """
+        partial = (self.partial, 0)[self.partial is None]
+        fid.write(pack(_preamble_fmt, _magic, self.size, self.mtime,
+                       self.cursor, len(self.frame), len(self.counts),
+                       len(self.layouts), int(self.terminated),
+                       int(self.partial is not None), partial))
+
+        np.asarray(self.offsets, dtype='<i8').tofile(fid)
+        np.asarray(self.frame, dtype='<i4').tofile(fid)
+        np.asarray(self.code, dtype='<i4').tofile(fid)
+        np.asarray(self.layout, dtype='<i4').tofile(fid)
+        np.array([len(ids) for ids in self.layouts],
+                 dtype='<i4').tofile(fid)
+        for ids in self.layouts:
+            np.asarray(ids, dtype='<i4').tofile(fid)
+        np.asarray(self.counts, dtype='<i8').tofile(fid)
+        np.asarray(self.numitems, dtype='<i8').tofile(fid)
+
+    @classmethod
+    def read(cls, filename, daq_filename=None):
+        """
+        read(filename[, daq_filename=None])
+
+        reads an index from a .daqidx sidecar
+
+        Parameters
+        ----------
+        filename : string
+            path to .daqidx file
+
+        daq_filename : None or string
+            None -> path of the indexed .daq is inferred from filename
+            string -> path of the indexed .daq
+
+        Returns
+        -------
+        index : DaqIndex
+        """
+        if daq_filename is None:
+            daq_filename = os.path.splitext(filename)[0] + '.daq'
+
+        index = cls()
+        with open(filename, 'rb') as fid:
+            # a truncated (e.g. partially written) sidecar is invalid
+            # like any other malformed one
+            try:
+                (magic, index.size, index.mtime, index.cursor, nframes,
+                 numentries, nlayouts, terminated, haspartial, partial) = \
+                    unpack(_preamble_fmt, fid.read(_preamble_size))
+            except StructError:
+                raise ValueError("'%s' is truncated"%filename)
+
+            if magic != _magic:
+                raise ValueError("'%s' is not a .daqidx file"%filename)
+
+            if min(nframes, numentries, nlayouts) < 0:
+                raise ValueError("'%s' is corrupt"%filename)
+
+            index.offsets = np.fromfile(fid, '<i8', nframes + 1)
+            index.frame = np.fromfile(fid, '<i4', nframes)
+            index.code = np.fromfile(fid, '<i4', nframes)
+            index.layout = np.fromfile(fid, '<i4', nframes)
+            lens = np.fromfile(fid, '<i4', nlayouts)
+            if len(lens) != nlayouts or np.any(lens < 0):
+                raise ValueError("'%s' is truncated"%filename)
+
+            index.layouts = [np.fromfile(fid, '<i4', n) for n in lens]
+            index.counts = np.fromfile(fid, '<i8', numentries)
+            index.numitems = np.fromfile(fid, '<i8', numentries)
+
+        if len(index.offsets) != nframes + 1 or \
+           len(index.layout) != nframes or \
+           any(len(ids) != n for ids, n in zip(index.layouts, lens)) or \
+           len(index.numitems) != numentries:
+            raise ValueError("'%s' is truncated"%filename)
+
+        index.filename = daq_filename
+        index.terminated = bool(terminated)
+        index.partial = (None, partial)[haspartial]
+
+        return index
+
+def load_index(filename, cursor, _header, save=True, fend=None):
+    """
+    load_index(filename, cursor, _header[, save=True][, fend=None])
+
+    returns the DaqIndex of a .daq file. The .daqidx sidecar is used when
+    it exists and is valid, otherwise the file is indexed (and the sidecar
+    is saved if save is True)
+
+    Parameters
+    ----------
+    filename : string
+        path to .daq file
+
+    cursor : int
+        byte where the data frames begin (Daq.cursor)
+
+    _header : Header
+        element header information (Daq._header)
+
+    save : bool
+        True -> write the sidecar after (re)building the index
+        False -> don't write the sidecar
+
+    fend : None or int
+        None -> index the whole file
+        int -> without a valid sidecar only index the file up to this
+               frame (ignored if save is True, see DaqIndex.build)
+
+    Returns
+    -------
+    index : DaqIndex
+    """
+    idx_filename = sidecar(filename)
+
+    if os.path.exists(idx_filename):
+        try:
+            index = DaqIndex.read(idx_filename, daq_filename=filename)
+        except (ValueError, IOError):
+            index = None
+
+        if index is not None and index.isvalid() and index.cursor == cursor:
+            return index
+
+    if save:
+        fend = None
+
+    index = DaqIndex.build(filename, cursor, _header, fend=fend)
+
+    if save:
+        # the sidecar only saves time later, so a directory that can't
+        # be written to (e.g. a shared archive) doesn't stop the load
+        try:
+            index.write(idx_filename)
+        except (IOError, OSError):
+            pass
+
+    return index
@@ -13,6 +13,47 @@ import numpy as np
 
 from undaqTools.element import Element
 
+def _clean_name(s):
+    """
+    unpacks a dynamic object name from the raw string of its slot.
+    
+    The operations are perfomed on the substring:
+     1. empty chars are replaced with ' '
+     2. string is reversed and split based on white space
+     3. resulting list of substrings are reversed
+     4. list of substrings is concatenated
+     5. whitespace is striped.
+    """
+    s = s.replace('\x00', ' ')[::-1]
+    return ''.join(s.split()[::-1]).strip()
+
+def _name_table(chars, width=32):
+    """
+    decodes the names of the dynamic objects in a 'SCC_DynObj_Name'
+    Element
+
+    The characters of each slot are viewed as one fixed-width string
+    so the slots of every frame are unpacked at once. Each distinct
+    string is only cleaned once.
+
+    Parameters
+    ----------
+    chars : Element
+        (slots*width x frames) character Element
+
+    width : int
+        characters per slot
+
+    Returns
+    -------
+    names : np.ndarray
+        (slots x frames) array of names
+    """
+    strings = chars.tostrings(width)
+    table, codes = np.unique(strings, return_inverse=True)
+    table = np.array([_clean_name(s) for s in table], dtype=table.dtype)
+    return table[codes].reshape(strings.shape)
+
 class DynObj:
     """
     class to represent AI controlled dynamic objects.
@@ -73,7 +114,7 @@ class DynObj:
     def __init__(self):
         self.name = ''
 
-    def process(self, cvedId, frame_indices, row_indices, daq):
+    def process(self, cvedId, frame_indices, row_indices, daq, name=None):
         """
         unpacks data from the SCC_DynObj* Elements
 
@@ -93,6 +134,11 @@ class DynObj:
 
         daq : Daq
             pointer to the parent Daq instance
+
+        name : None or string
+            None -> name is unpacked from 'SCC_DynObj_Name'
+            string -> name of the dynamic object (Daq._process_dynobjs
+                      unpacks the names of all the objects at once)
     
         Notes
         -----
@@ -123,16 +169,10 @@ class DynObj:
 
         # to unpack the name we look at the 'SCC_DynObj_Name' on the first
         # frame that the dynamic object is present. The string array is
-        # split into 20 segments of 32 chars. Then the following operations
-        # are perfomed on the substring
-        #  1. empty chars are replaced with ' '
-        #  2. string is reversed and split based on white space
-        #  3. resulting list of substrings are reversed
-        #  4. list of substrings is concatenated
-        #  5. whitespace is striped.
-        str_array = daq['SCC_DynObj_Name'][r*32:r*32+32, c][::-1]
-        self.name = ''.join([(s,' ')[s==''] for s in str_array]).split()[::-1]
-        self.name = ''.join(self.name).strip()
+        # split into 20 segments of 32 chars (see _name_table)
+        if name is None:
+            name = _name_table(daq['SCC_DynObj_Name'][:, c:c+1])[r, 0]
+        self.name = name
 
         # specifies whether array attributes have been interpolated
         self.interpolated = 0
@@ -3,6 +3,9 @@ from __future__ import print_function
 # Copyright (c) 2013, Roger Lew
 # All rights reserved.
 
+from collections import namedtuple
+from numbers import Integral
+
 import numpy as np
 
 from undaqTools.misc.base import _size_lookup, \
@@ -76,6 +79,88 @@ def findex(frame):
     return FrameIndex(frame)
 
 
+def _frames_contiguous(frames):
+    """
+    returns True if the (sorted) frames have no gaps
+    """
+    n = len(frames)
+    return n > 0 and int(frames[-1]) - int(frames[0]) + 1 == n
+
+def _frame_search(frames, f, side='left'):
+    """
+    np.searchsorted(frames, f, side) for sorted frames. Integer frames
+    are found arithmetically when the frames are contiguous.
+    """
+    if _frames_contiguous(frames):
+        n, f0 = len(frames), int(frames[0])
+        right = int(side == 'right')
+
+        if isinstance(f, Integral):
+            return min(max(int(f) - f0 + right, 0), n)
+
+        f = np.asarray(f)
+        if f.dtype.kind in 'iu':
+            return np.clip(f.astype(np.int64) - f0 + right, 0, n)
+
+    return np.searchsorted(frames, f, side)
+
+class FrameAxis(np.ndarray):
+    """
+    Immutable array of frame numbers shared by Elements
+
+    All the non-CSSDC Elements of a Daq are sampled on the same frames.
+    Elements built on a FrameAxis reference it instead of keeping their
+    own copy of the frames, so building them doesn't depend on the
+    number of frames. Slices of a FrameAxis are read-only views.
+    """
+    def __new__(cls, frames):
+        """
+        FrameAxis(frames)
+
+        Parameters
+        ----------
+        frames : array_like
+            frame numbers (cast to uint32)
+        """
+        obj = np.array(frames, dtype=np.uint32).view(cls)
+        obj.flags.writeable = False
+        return obj
+
+    def __array_wrap__(self, obj, context=None):
+        # arithmetic on frame numbers gives plain arrays
+        return obj.view(np.ndarray)
+
+class ElementMeta(namedtuple('ElementMeta', ['name', 'id', 'rate',
+                                             'varrateflag', 'numvalues',
+                                             'units', 'nptype', 'type',
+                                             'bytes'])):
+    """
+    Immutable metadata of an Element
+
+    Views, slices and ufunc results of an Element reference the same
+    ElementMeta. Setting a metadata attribute of an Element replaces
+    its ElementMeta (the other views keep the old one).
+    """
+    __slots__ = ()
+
+def _meta_property(field):
+    """
+    returns property that reads and replaces field of Element._meta
+    """
+    def fget(self):
+        meta = self._meta
+        if meta is None:
+            return None
+        return getattr(meta, field)
+
+    def fset(self, value):
+        meta = self._meta
+        if meta is None:
+            meta = ElementMeta(*[None for f in ElementMeta._fields])
+        self._meta = meta._replace(**{field: value})
+
+    return property(fget, fset, doc='%s (from ElementMeta)'%field)
+
 class Element(np.ndarray, object):
     """
     Container to hold NADS DAQ cell data
@@ -91,8 +176,9 @@ class Element(np.ndarray, object):
         data : array_like
             shape should be (numvalues X number of samples)
         
-        frames : array_like
-            shape should be (number of samples,)
+        frames : array_like or FrameAxis
+            shape should be (number of samples,). A FrameAxis is
+            referenced instead of copied
             
         rate : int, optional
             specifies whether measure is CSSDC
@@ -117,6 +203,11 @@ class Element(np.ndarray, object):
         order : string
             specifies the column order. Needed to write the
             mat files. Shouldn't be important to most end users.
+
+        copy : bool, optional
+            False -> data is referenced instead of copied when it already
+            has the right type and shape (e.g. views into a memory mapped
+            .daq file)
              
         See Also
         --------
@@ -126,62 +217,76 @@ class Element(np.ndarray, object):
         
         dtype = kwds.get('dtype', None)
         order = kwds.get('order', None)
+        copy = kwds.get('copy', True)
         
         # array can handle the letter dtypes, as well as None and the np.type
         # objects
-        obj = np.array(data, ndmin=2, dtype=dtype, order=order).view(cls)
-        obj.frames  = np.array(frames, dtype=np.uint32)
+        obj = np.array(data, ndmin=2, dtype=dtype, order=order,
+                       copy=copy).view(cls)
+        if isinstance(frames, FrameAxis):
+            obj.frames = frames
+        else:
+            obj.frames = np.array(frames, dtype=np.uint32)
         
         if obj.shape[1] != obj.frames.shape[0]:
             raise ValueError('data and frames are not aligned')
         
-        # set or find other attributes
-        obj.numvalues = obj.shape[0]
-        obj.name = kwds.get('name', None)
-        obj.id = kwds.get('elemid', None)   
-        obj.units = kwds.get('units', '')
-        obj.varrateflag = kwds.get('varrateflag', 0)
-
-        obj.type, obj.nptype == None, None 
+        # boolean mask of the samples filled in over missing frames
+        # (see Daq._interpolate_missing_frames)
+        obj.interpolated = None
+
+        # find the other attributes
+        typ, nptype = None, None
         if dtype is None:
-            obj.nptype = obj.dtype
-            obj.type = _type_lookup[obj.nptype]
+            nptype = obj.dtype
+            typ = _type_lookup[nptype]
         elif dtype in _nptype_lookup:
-            obj.type = dtype
-            obj.nptype = _nptype_lookup[obj.type]
+            typ = dtype
+            nptype = _nptype_lookup[typ]
         elif dtype in _type_lookup:
-            obj.nptype = dtype
-            obj.type = _type_lookup[obj.nptype]
+            nptype = dtype
+            typ = _type_lookup[nptype]
             
-        if obj.type is None or obj.nptype is None:
+        if typ is None or nptype is None:
             raise Exception('Could not find identify type for Element')
         
-        obj.bytes = _size_lookup[obj.type]
-        
         rate = kwds.get('rate', None)
         if rate is None:
             if obj.frames[-1] - obj.frames[0] > len(obj.frames):
                 # missing frames
-                obj.rate = -1
+                rate = -1
             else:
-                obj.rate = 1
-        else:
-            obj.rate = rate
+                rate = 1
+
+        obj._meta = ElementMeta(name=kwds.get('name', None),
+                                id=kwds.get('elemid', None),
+                                rate=rate,
+                                varrateflag=kwds.get('varrateflag', 0),
+                                numvalues=obj.shape[0],
+                                units=kwds.get('units', ''),
+                                nptype=nptype,
+                                type=typ,
+                                bytes=_size_lookup[typ])
                     
         return obj
 
-    def __array_finalize__(self, obj):
+    # the metadata lives in one shared ElementMeta
+    name = _meta_property('name')
+    id = _meta_property('id')
+    rate = _meta_property('rate')
+    varrateflag = _meta_property('varrateflag')
+    numvalues = _meta_property('numvalues')
+    units = _meta_property('units')
+    nptype = _meta_property('nptype')
+    type = _meta_property('type')
+    bytes = _meta_property('bytes')
 
-        self.name = getattr(obj, 'name', None)
-        self.id = getattr(obj, 'id', None)
-        self.rate = getattr(obj, 'rate', None)
-        self.varrateflag = getattr(obj, 'varrateflag', None)
-        self.numvalues = getattr(obj, 'numvalues', None)
-        self.units = getattr(obj, 'units', None)
-        self.nptype = getattr(obj, 'nptype', None)
-        self.type = getattr(obj, 'type', None)
-        self.bytes = getattr(obj, 'bytes', None)
+    def __array_finalize__(self, obj):
+        # only the frames (and the interpolated mask) differ between
+        # an Element and its views
+        self._meta = getattr(obj, '_meta', None)
         self.frames = getattr(obj, 'frames', None)
+        self.interpolated = getattr(obj, 'interpolated', None)
 
     __array_finalize__.__doc__ = np.ndarray.__array_finalize__.__doc__
 
@@ -230,11 +335,11 @@ class Element(np.ndarray, object):
                     
                 i0 = f0
                 if f0 is not None:
-                    i0 = np.searchsorted(self.frames, f0)
+                    i0 = _frame_search(self.frames, f0)
         
                 iend = fend
                 if fend is not None:
-                    iend = np.searchsorted(self.frames, fend)
+                    iend = _frame_search(self.frames, fend)
                     
                 indx = (indx[0], slice(i0, iend, step))
                 
@@ -251,6 +356,8 @@ class Element(np.ndarray, object):
         if isinstance(obj, Element) and  isinstance(indx, tuple):
             if obj.frames is not None:
                 obj.frames = obj.frames[indx[-1]]
+            if obj.interpolated is not None:
+                obj.interpolated = obj.interpolated[indx[-1]]
             
         return obj
 
@@ -272,9 +379,8 @@ class Element(np.ndarray, object):
 
         """
             
-        indx1 = np.searchsorted(self.frames, frame)-1
-        indx2 = np.searchsorted(self.frames-1, frame)-1
-        indx = max(indx1, indx2)
+        # last sample at or before frame
+        indx = _frame_search(self.frames, frame, side='right') - 1
 
         # before first frame        
         if indx < 0:
@@ -287,6 +393,65 @@ class Element(np.ndarray, object):
         else:
             return val
 
+    def states_at(self, frames, fill=np.nan):
+        """
+        returns the states of the Element at many frames at once
+
+        The state at a frame is the last sample at or before it (zero
+        order hold), like indexing with a FrameIndex.
+
+        Parameters
+        ----------
+        frames : array_like
+            frames to look up
+
+        fill : scalar
+            state before the first frame of the Element. The result is
+            upcast if needed to hold it.
+
+        Returns
+        -------
+        x : np.ndarray
+            (numvalues x len(frames)) array of states
+        """
+        frames = np.asarray(frames)
+        indx = np.atleast_1d(_frame_search(self.frames, frames,
+                                           side='right')) - 1
+        before = indx < 0
+
+        data = np.asarray(self)
+        if data.shape[1] == 0:
+            x = np.empty((data.shape[0], len(indx)),
+                         dtype=np.result_type(data, fill))
+            x.fill(fill)
+            return x
+
+        x = data[:, np.maximum(indx, 0)]
+        if np.any(before):
+            x = x.astype(np.result_type(x, fill))
+            x[:, before] = fill
+        return x
+
+    @property
+    def values(self):
+        """
+        the data as a plain np.ndarray view (no copy, no metadata).
+        Faster than the Element itself in tight loops.
+        """
+        return self.view(np.ndarray)
+
+    def isContiguous(self):
+        """
+        evaluates whether the Element has a sample for every frame from
+        its first to its last frame. Frames of contiguous Elements are
+        found by arithmetic instead of searching.
+
+        Returns
+        -------
+        answer : bool
+        """
+        return _frames_contiguous(self.frames)
+
     def toarray(self, ndmin=1, order=None):
         """
         cast data to plain old numpy array
@@ -306,6 +471,42 @@ class Element(np.ndarray, object):
         """
         return np.array(self, ndmin=ndmin, order=order)
 
+    def tostrings(self, width=None):
+        """
+        joins the characters of a character ('c') Element into fixed-width
+        byte strings
+        
+        Parameters
+        ----------
+        width : None or int
+            None -> one string of all the characters (rows) of a sample
+            int -> number of characters per string. The number of rows
+                   must be a multiple of width
+            
+        Returns
+        -------
+        x : np.ndarray
+            (rows/width x samples) array of 'S<width>' strings.
+            Trailing null characters are dropped by numpy.
+        """
+        if self.type != 'c':
+            raise TypeError('Element is not a character cell')
+
+        # the rows of a sliced Element, not the numvalues of the
+        # Element it was sliced from
+        rows = self.shape[0]
+
+        if width is None:
+            width = rows
+
+        if width < 1 or rows % width != 0:
+            raise ValueError('rows are not a multiple of width')
+
+        # the characters of a sample have to be contiguous to be viewed
+        # as strings
+        chars = np.ascontiguousarray(np.asarray(self).transpose())
+        return chars.view('S%i'%width).transpose()
+
     def __str__(self):
         datas = super(Element, self) \
                     .__str__() \
@@ -358,4 +559,265 @@ class Element(np.ndarray, object):
             True if it is a CSSDC measure, False otherwise
         """
         return self.rate != 1
-        
\ No newline at end of file
+        
+class RaggedElement(object):
+    """
+    Container to hold NADS DAQ cell data collected at a variable rate
+
+    The number of values of a varrateflag cell changes from frame to
+    frame. The values of all the frames are kept end to end in one flat
+    array and offsets tells where the values of each frame begin and
+    end. The values of the k-th frame are values[offsets[k]:offsets[k+1]].
+    """
+    def __init__(self, values, offsets, frames, **kwds):
+        """
+        RaggedElement(values, offsets, frames[, **kwds])
+
+        Create a new RaggedElement instance.
+
+        Parameters
+        ----------
+        values : array_like
+            shape should be (total number of values,)
+
+        offsets : array_like
+            shape should be (number of samples + 1,). offsets[0] is 0
+            and offsets[-1] is len(values)
+
+        frames : array_like
+            shape should be (number of samples,)
+
+        rate : int, optional
+            specifies whether measure is CSSDC
+
+        name : string, optional
+            specifies the name of the cell
+
+        dtype : string or numpy type, optional
+            type of data
+
+        varrateflag : int, optional
+            specifies whether data is collected at a variable rate
+
+        elemid : int, optional
+            specifies index in _header dict
+
+        units : string, optional
+            units of the cell
+
+        numvalues : int, optional
+            maximum number of values in a frame (from the header).
+            Defaults to the largest number of values found in a frame.
+
+        See Also
+        --------
+        :doc:`fslice` : FrameSlice factory for slicing Element by frames
+        :doc:`findex` : FrameIndex factory for indexing Element by a frame
+        """
+        dtype = kwds.get('dtype', None)
+        if dtype is not None:
+            dtype = _nptype_lookup.get(dtype, dtype)
+
+        self.values = np.asarray(values, dtype=dtype).ravel()
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if isinstance(frames, FrameAxis):
+            self.frames = frames
+        else:
+            self.frames = np.array(frames, dtype=np.uint32)
+
+        if len(self.offsets) != len(self.frames) + 1:
+            raise ValueError('offsets and frames are not aligned')
+
+        if self.offsets[0] != 0 or self.offsets[-1] != len(self.values):
+            raise ValueError('offsets do not span values')
+
+        self.name = kwds.get('name', None)
+        self.id = kwds.get('elemid', None)
+        self.units = kwds.get('units', '')
+        self.varrateflag = kwds.get('varrateflag', 1)
+        self.rate = kwds.get('rate', -1)
+
+        self.nptype = self.values.dtype
+        self.type = _type_lookup.get(self.nptype, None)
+        if self.type is None:
+            raise Exception('Could not find identify type for Element')
+        self.bytes = _size_lookup[self.type]
+
+        numvalues = kwds.get('numvalues', None)
+        if numvalues is None:
+            numvalues = (0, int(np.max(self.counts)))[len(self.frames) > 0]
+        self.numvalues = numvalues
+
+    @property
+    def counts(self):
+        """
+        number of values in each frame
+        """
+        return np.diff(self.offsets)
+
+    @property
+    def dtype(self):
+        """
+        numpy type of the values
+        """
+        return self.values.dtype
+
+    @property
+    def nbytes(self):
+        """
+        bytes used by the values, offsets and frames
+        """
+        return self.values.nbytes + self.offsets.nbytes + self.frames.nbytes
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        for k in xrange(len(self.frames)):
+            yield self.values[self.offsets[k]:self.offsets[k+1]]
+
+    def __getitem__(self, indx):
+        """
+        elem.__getitem__(indx) <==> elem[indx]
+
+        Parameters
+        ----------
+        indx : int, slice, FrameSlice, FrameIndex or tuple
+            int -> array with the values of the sample
+            slice, FrameSlice -> RaggedElement of the samples
+            FrameIndex -> values of the last sample at or before the frame
+                          (nan before the first frame)
+            tuple -> (None or slice(None), indx) is the same as indx
+
+        Returns
+        -------
+        view : RaggedElement or np.ndarray
+            the requested data (values are not copied)
+        """
+        # Element is indexed (row, sample). The rows of a ragged
+        # element aren't aligned so only whole samples can be selected
+        if isinstance(indx, tuple) and \
+           not isinstance(indx, (FrameSlice, FrameIndex)):
+            if len(indx) != 2 or indx[0] not in (None, slice(None)):
+                raise IndexError('RaggedElement rows can not be indexed')
+            indx = indx[1]
+
+        if isinstance(indx, FrameIndex):
+            return self._state_at_frame(indx.frame)
+
+        if isinstance(indx, FrameSlice):
+            i0, iend = indx.start, indx.stop
+            if i0 is not None:
+                i0 = _frame_search(self.frames, i0)
+            if iend is not None:
+                iend = _frame_search(self.frames, iend)
+            indx = slice(i0, iend, indx.step)
+
+        if isinstance(indx, slice):
+            return self._take(np.arange(len(self.frames))[indx])
+
+        k = int(indx)
+        if k < 0:
+            k += len(self.frames)
+        if not 0 <= k < len(self.frames):
+            raise IndexError('index out of bounds')
+        return self.values[self.offsets[k]:self.offsets[k+1]]
+
+    def _take(self, ks):
+        """
+        returns RaggedElement with the samples ks (a sorted index array)
+        """
+        if len(ks) > 0 and np.all(np.diff(ks) == 1):
+            # contiguous samples are a view into the flat values
+            a, b = self.offsets[ks[0]], self.offsets[ks[-1]+1]
+            values = self.values[a:b]
+            offsets = self.offsets[ks[0]:ks[-1]+2] - a
+        else:
+            counts = self.counts[ks]
+            offsets = np.zeros(len(ks) + 1, dtype=np.int64)
+            np.cumsum(counts, out=offsets[1:])
+
+            # position in values of every value kept
+            starts = np.repeat(self.offsets[ks] - offsets[:-1], counts)
+            values = self.values[starts + np.arange(offsets[-1])]
+
+        return RaggedElement(values, offsets, self.frames[ks],
+                             rate=self.rate,
+                             name=self.name,
+                             dtype=self.type,
+                             varrateflag=self.varrateflag,
+                             elemid=self.id,
+                             units=self.units,
+                             numvalues=self.numvalues)
+
+    def _state_at_frame(self, frame):
+        """
+        returns the values of the last sample at or before frame
+        (nan before the first frame)
+        """
+        indx = _frame_search(self.frames, frame, side='right') - 1
+
+        if indx < 0:
+            return np.nan
+
+        return self[int(indx)]
+
+    def tolist(self):
+        """
+        returns list with an array of the values of each sample
+        """
+        return list(self)
+
+    def toarray(self, fill=0):
+        """
+        pad the samples to a (numvalues x samples) numpy array
+
+        Parameters
+        ----------
+        fill : scalar
+            value of the missing items of samples with less than
+            numvalues values
+
+        Returns
+        -------
+        x : np.ndarray
+        """
+        counts = self.counts
+        width = max(self.numvalues, (0, np.max(counts))[len(counts) > 0])
+        out = np.empty((width, len(self.frames)), dtype=self.nptype)
+        out.fill(fill)
+
+        cols = np.repeat(np.arange(len(counts)), counts)
+        rows = np.arange(len(self.values)) - np.repeat(self.offsets[:-1],
+                                                       counts)
+        out[rows, cols] = self.values
+        return out
+
+    def __str__(self):
+        slist = ["RaggedElement(values = %s,"%str(self.values),
+                 "             offsets = %s,"%str(self.offsets),
+                 "              frames = %s,"%str(self.frames),
+                 "                name = '%s',"%self.name,
+                 "           numvalues = %i,"%self.numvalues,
+                 "                rate = %i,"%self.rate,
+                 "              nptype = %s)"%str(self.nptype)]
+
+        return '\n'.join(slist)
+
+    def __repr__(self):
+        return 'RaggedElement(%s)'%', '.join([repr(self.values),
+                                               repr(self.offsets),
+                                               repr(self.frames),
+                                               'name=%r'%self.name,
+                                               'rate=%r'%self.rate])
+
+    def isCSSDC(self):
+        """
+        evaluates whether element is a CSSDC measure
+
+        Returns
+        -------
+        answer : bool
+            True if it is a CSSDC measure, False otherwise
+        """
+        return self.rate != 1
@@ -17,6 +17,7 @@ import numpy as np
 from pyvttbl import DataFrame
 
 from   undaqTools import Daq
+from   undaqTools.reduce import epoch_stats
 
 # dependent variables and indices that we want to analyze
 dvs = [('CFS_Accelerator_Pedal_Position', 0),
@@ -50,7 +51,11 @@ if __name__ == '__main__':
         daq.read_hd5(hd5_file)
 
         # daq.etc was configured in Example02_*
-        for (epoch, fslice) in daq.etc['epochs'].items():
+        # every statistic of every dv for all the epochs at once
+        stats = epoch_stats(daq, dvs, daq.etc['epochs'])
+
+        for rec in stats:
+            epoch = int(rec['epoch'])
             
             # figure out pid and independent variable conditions
             pid = daq.etc['pid']
@@ -64,16 +69,8 @@ if __name__ == '__main__':
                                ('scenario', scenario),
                                ('section', section)])
             
-            for (dv, indx) in dvs:
-                vec = daq[dv][indx,fslice].flatten()
-
-                row['%s_mean'%dv] = np.mean(vec)
-                row['%s_min'%dv] = np.min(vec)
-                row['%s_max'%dv] = np.max(vec)
-                row['%s_range'%dv] = row['%s_max'%dv] - row['%s_min'%dv]
-                row['%s_amean'%dv] = np.mean(np.abs(vec))
-                row['%s_sd'%dv] = np.std(vec)
-                row['%s_rms'%dv] = np.linalg.norm(vec)/np.sqrt(len(vec))
+            for name in stats.dtype.names[1:]:
+                row[name] = rec[name]
 
             # insert the row into the dataframe
             df.insert(row)
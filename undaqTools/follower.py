@@ -0,0 +1,278 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import time
+
+from array import array
+
+import numpy as np
+
+from undaqTools.daq import Daq, _decode_frames
+from undaqTools.daqindex import DaqIndex
+from undaqTools.element import Element, RaggedElement, FrameAxis
+
+class _Buffer(object):
+    """
+    (numvalues x frames) array that grows by doubling its capacity
+    """
+    def __init__(self, numvalues, dtype, capacity=1024):
+        self.data = np.zeros((numvalues, capacity), dtype=dtype)
+        self.n = 0
+
+    def extend(self, block):
+        """
+        appends a (numvalues x k) block
+        """
+        k = block.shape[1]
+        if self.n + k > self.data.shape[1]:
+            capacity = max(2*self.data.shape[1], self.n + k)
+            data = np.zeros((self.data.shape[0], capacity),
+                            dtype=self.data.dtype)
+            data[:, :self.n] = self.data[:, :self.n]
+            self.data = data
+
+        self.data[:, self.n:self.n + k] = block
+        self.n += k
+
+    def view(self):
+        """
+        returns the filled part of the buffer (no copy)
+        """
+        return self.data[:, :self.n]
+
+    def axis(self):
+        """
+        returns the filled part of a (1 x frames) uint32 buffer as a
+        read-only FrameAxis (no copy)
+        """
+        axis = self.data[0, :self.n].view(FrameAxis)
+        axis.flags.writeable = False
+        return axis
+
+class DaqFollower(object):
+    """
+    Follows a .daq file that is still being recorded
+
+    The header is parsed once. Every call to poll reads the complete
+    frames appended since the last call, starting at the byte offset
+    the previous call stopped at. An incomplete frame at the end of the
+    file is left for the next poll.
+
+    The data read so far is kept in self.daq. Its Elements are views
+    into buffers that grow as frames are appended, so they should be
+    taken from self.daq again after each poll.
+
+    Dynamic objects are not processed, missing frames are not
+    interpolated and the lane deviation is not unwrapped.
+
+    Attributes
+    ----------
+    daq : Daq
+        the data read so far
+
+    cursor : int
+        byte offset of the next frame to read
+
+    terminated : bool
+        True once the end of data code (-2) has been read
+
+    Example
+    -------
+    >>> from undaqTools import DaqFollower
+    >>> follower = DaqFollower('drive01.daq', ['VDS_Veh_Speed'])
+    >>> for daq in follower.follow(interval=0.5):
+    ...     print(daq.fend, daq['VDS_Veh_Speed'][0, -1])
+    """
+    def __init__(self, filename, elemlist=None):
+        """
+        Parameters
+        ----------
+        filename : string
+            path to .daq file (the header must already be written)
+
+        elemlist : None or list_like
+             None -> follow all elements
+             list_like -> follow names that match list
+        """
+        self.daq = daq = Daq()
+        daq.read_daq(filename, elemlist=elemlist, loaddata=False)
+
+        self._header = _header = daq._header
+        daq._header = None
+        self._mask = daq._elemlist_mask(_header)
+
+        self.cursor = daq.cursor
+        self.terminated = False
+
+        self._frames = _Buffer(1, np.uint32)
+        self._buffers = {}
+        for name, i, rate in zip(_header.name, _header.id, _header.rate):
+            if not self._mask[i]:
+                continue
+
+            if _header.varrateflag[i]:
+                # values packed end to end and the offsets of the frames
+                # (see RaggedElement)
+                self._buffers[name] = _Buffer(1, _header.nptype[i])
+                offsets = _Buffer(1, np.int64)
+                offsets.extend(np.zeros((1, 1), dtype=np.int64))
+                self._buffers[name+'_Offsets'] = offsets
+            else:
+                self._buffers[name] = _Buffer(_header.numvalues[i],
+                                              _header.nptype[i])
+
+            if rate != 1:
+                self._buffers[name+'_Frames'] = _Buffer(1, np.uint32)
+
+        daq.frame.code = array('i')
+        daq.frame.count = array('i')
+        daq.frame.frame = self._frames.view()[0].view(np.int32)
+
+    def poll(self):
+        """
+        reads the complete frames appended since the last poll
+
+        Returns
+        -------
+        n : int
+            number of frames read
+        """
+        if self.terminated:
+            return 0
+
+        _header = self._header
+        filename = self.daq.info.filename
+
+        # The index finds the complete frames after the cursor and stops
+        # at an incomplete one
+        index = DaqIndex.build(filename, self.cursor, _header)
+        n = len(index)
+
+        if n > 0:
+            buf = np.memmap(filename, dtype=np.uint8, mode='r')
+            buf = buf.view(np.ndarray)
+            tmpdata = _decode_frames(buf, index, _header, self._mask, 0, n)
+            del buf
+
+            for name, values in tmpdata.iteritems():
+                if isinstance(values, list):
+                    self._extend_ragged(name, values)
+                    continue
+
+                if name.endswith('_Frames'):
+                    values = values.reshape(1, -1)
+                self._buffers[name].extend(values)
+
+            frame = self.daq.frame
+            counts = np.array([len(ids) for ids in index.layouts], 'i4')
+            frame.code.extend(array('i', index.code.tostring()))
+            frame.count.extend(array('i', counts[index.layout].tostring()))
+            self._frames.extend(index.frame.reshape(1, -1))
+
+        self.cursor = int(index.offsets[-1])
+
+        if index.terminated:
+            self.terminated = True
+            self.daq.frame.code.append(-2)
+
+        if n > 0:
+            self._refresh()
+
+        return n
+
+    def follow(self, interval=1., timeout=None):
+        """
+        follow([interval=1.][, timeout=None])
+
+        generator that polls the file every interval seconds and yields
+        self.daq whenever new frames have been read. Stops when the
+        recording ends or when no frames have been appended for
+        timeout seconds.
+
+        Parameters
+        ----------
+        interval : float
+            seconds between polls
+
+        timeout : None or float
+            None -> wait for the end of data code
+            float -> stop after this many seconds without new frames
+        """
+        last = time.time()
+        while not self.terminated:
+            if self.poll() > 0:
+                last = time.time()
+                yield self.daq
+            elif timeout is not None and time.time() - last > timeout:
+                return
+            else:
+                time.sleep(interval)
+
+    def _extend_ragged(self, name, samples):
+        """
+        appends the per-frame arrays of a varrateflag element to its
+        values and offsets buffers. The arrays are views into the
+        mapped file, so they are copied to let the map be released.
+        """
+        offsets = self._buffers[name+'_Offsets']
+        counts = np.array([len(v) for v in samples], dtype=np.int64)
+        last = offsets.view()[0, -1]
+        offsets.extend((last + np.cumsum(counts)).reshape(1, -1))
+
+        if counts.sum() > 0:
+            values = np.concatenate([np.array(v, copy=True)
+                                     for v in samples])
+            self._buffers[name].extend(values.reshape(1, -1))
+
+    def _refresh(self):
+        """
+        rebuilds the Elements of self.daq from the buffers
+        """
+        _header = self._header
+        daq = self.daq
+        # the non-CSSDC Elements share one frame axis. It is a view of
+        # the buffer so building it doesn't depend on the number of
+        # frames read so far
+        axis = self._frames.axis()
+
+        # frame.frame is int32 like it is for Daq.read
+        frames = axis.view(np.ndarray).view(np.int32)
+        daq.frame.frame = frames
+        daq.f0 = frames[0]
+        daq.fend = frames[-1]
+
+        for name, i, rate in zip(_header.name, _header.id, _header.rate):
+            if not self._mask[i]:
+                continue
+
+            if rate != 1:
+                elem_frames = self._buffers[name+'_Frames'].axis()
+            else:
+                elem_frames = axis
+
+            if _header.varrateflag[i]:
+                # built from views of the buffers (nothing is repacked)
+                daq[name] = \
+                    RaggedElement(self._buffers[name].view()[0],
+                                  self._buffers[name+'_Offsets'].view()[0],
+                                  elem_frames,
+                                  rate=_header.rate[i],
+                                  name=_header.name[i],
+                                  dtype=_header.type[i],
+                                  varrateflag=_header.varrateflag[i],
+                                  elemid=_header.id[i],
+                                  units=_header.units[i],
+                                  numvalues=_header.numvalues[i])
+                continue
+
+            daq[name] = Element(self._buffers[name].view(),
+                                elem_frames,
+                                copy=False,
+                                rate=_header.rate[i],
+                                name=_header.name[i],
+                                dtype=_header.type[i],
+                                varrateflag=_header.varrateflag[i],
+                                elemid=_header.id[i],
+                                units=_header.units[i])
@@ -58,6 +58,22 @@ def _searchsorted(a, v):
     else:
         return np.searchsorted(a.flatten(), v)
         
+def _parse_bytes(nbytes):
+    """
+    returns the number of bytes in a size like 4096, '512MB' or '4GB'
+    """
+    if not isinstance(nbytes, string_types):
+        return int(nbytes)
+
+    units = {'': 1, 'B': 1, 'KB': 1024, 'MB': 1024**2, 'GB': 1024**3,
+             'TB': 1024**4}
+    s = nbytes.strip().upper()
+    number = s.rstrip('KMGTB ')
+    unit = s[len(number):].strip()
+    if unit not in units:
+        raise ValueError("can't understand size '%s'"%nbytes)
+    return int(float(number)*units[unit])
+
 def _namedtuple_factory(typename, field_names, verbose=False,
                  rename=False, docstring=''):
     # http://stackoverflow.com/a/3349937
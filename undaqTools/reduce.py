@@ -0,0 +1,397 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+"""
+Reductions of Elements over epochs and across drives
+"""
+
+import numpy as np
+
+from undaqTools.element import RaggedElement, _frame_search
+
+# statistics epoch_stats knows how to compute
+stat_names = ('mean', 'min', 'max', 'range', 'amean', 'sd', 'rms')
+
+def _epoch_bounds(frames, epochs):
+    """
+    returns the (start, stop) sample indices of FrameSlice epochs
+    """
+    n = len(frames)
+    starts = np.zeros(len(epochs), dtype=np.intp)
+    stops = np.zeros(len(epochs), dtype=np.intp)
+
+    for k, fs in enumerate(epochs):
+        if fs.step not in (None, 1):
+            raise ValueError('epochs can not have a step')
+
+        starts[k] = 0 if fs.start is None else _frame_search(frames, fs.start)
+        stops[k] = n if fs.stop is None else _frame_search(frames, fs.stop)
+
+    return starts, np.maximum(starts, stops)
+
+def _segment_reduce(ufunc, x, starts, stops):
+    """
+    returns ufunc reduced over x[starts[k]:stops[k]] for every k
+
+    np.ufunc.reduceat reduces x[idx[i]:idx[i+1]] for every i, so the
+    starts and stops are interleaved and every other result is kept.
+    x is padded so the stops are valid indices. Empty segments are nan.
+    """
+    padded = np.empty(len(x) + 1, dtype=x.dtype)
+    padded[:-1] = x
+    padded[-1] = 0
+
+    idx = np.empty(2*len(starts), dtype=np.intp)
+    idx[0::2] = starts
+    idx[1::2] = stops
+
+    out = ufunc.reduceat(padded, idx)[0::2].astype(np.float64)
+    out[starts == stops] = np.nan
+    return out
+
+def epoch_stats(daq, dvs, epochs, stats=stat_names):
+    """
+    epoch_stats(daq, dvs, epochs[, stats=stat_names])
+
+    computes summary statistics of many dependent variables over many
+    epochs. Every statistic of a dependent variable is computed for all
+    the epochs at once from prefix sums (mean, amean, sd, rms) and
+    np.ufunc.reduceat (min, max, range) over the epoch boundaries.
+
+    Parameters
+    ----------
+    daq : Daq
+        drive to reduce
+
+    dvs : list of tuples
+        (name, row) pairs of the dependent variables
+
+    epochs : dict or list_like
+        dict -> epoch label to FrameSlice (e.g. daq.etc['epochs'])
+        list_like -> FrameSlices
+
+    stats : list_like
+        statistics to compute. Any of:
+            'mean'  : mean
+            'min'   : minimum
+            'max'   : maximum
+            'range' : max - min
+            'amean' : mean of the absolute values
+            'sd'    : (population) standard deviation
+            'rms'   : root mean square
+
+    Returns
+    -------
+    x : np.ndarray
+        structured array with one record per epoch. The 'epoch' field
+        holds the label (or the position in epochs) and is followed by
+        a '<name>_<stat>' field for every dependent variable and
+        statistic. If a name is in dvs more than once its fields are
+        '<name>_<row>_<stat>'. Statistics of empty epochs and of
+        epochs holding a nan are nan (other epochs are not affected).
+
+    Example
+    -------
+    >>> from undaqTools.reduce import epoch_stats
+    >>> dvs = [('VDS_Veh_Speed', 0), ('SCC_Lane_Deviation', 1)]
+    >>> x = epoch_stats(daq, dvs, daq.etc['epochs'])
+    >>> x['VDS_Veh_Speed_mean']
+    """
+    stats = list(stats)
+    for stat in stats:
+        if stat not in stat_names:
+            raise ValueError("unknown statistic '%s'"%stat)
+
+    if isinstance(epochs, dict):
+        labels, epochs = list(epochs.keys()), list(epochs.values())
+    else:
+        epochs = list(epochs)
+        labels = range(len(epochs))
+
+    names = [name for name, row in dvs]
+    fields = [('epoch', np.asarray(labels).dtype)]
+    prefixes = []
+    for name, row in dvs:
+        if names.count(name) > 1:
+            prefixes.append('%s_%i'%(name, row))
+        else:
+            prefixes.append(name)
+        fields.extend(('%s_%s'%(prefixes[-1], stat), np.float64)
+                      for stat in stats)
+
+    x = np.zeros(len(epochs), dtype=fields)
+    x['epoch'] = labels
+
+    # the boundaries only depend on the frames, which Elements
+    # recorded at the same rate share
+    bounds = {}
+
+    for (name, row), prefix in zip(dvs, prefixes):
+        elem = daq[name]
+        if isinstance(elem, RaggedElement):
+            raise TypeError("'%s' is a RaggedElement"%name)
+
+        key = id(elem.frames)
+        if key not in bounds:
+            bounds[key] = (elem.frames, _epoch_bounds(elem.frames, epochs))
+        starts, stops = bounds[key][1]
+
+        vec = elem.values[row]
+        n = (stops - starts).astype(np.float64)
+        n[n == 0] = np.nan
+
+        results = {}
+
+        # A nan only makes the epochs that hold it nan (like reducing
+        # every epoch separately). The prefix sums are built with the
+        # nans zeroed and a prefix count of the nans finds those epochs.
+        v = vec.astype(np.float64)
+        isnan = np.isnan(v)
+        cnan = np.zeros(len(v) + 1, dtype=np.intp)
+        np.cumsum(isnan, out=cnan[1:])
+        hasnan = (cnan[stops] - cnan[starts]) > 0
+        v[isnan] = 0.
+
+        if set(stats) & set(['mean', 'sd', 'rms']):
+            # prefix sums of the values and their squares. The values
+            # are centered first to keep the sums of squares accurate.
+            ref = 0.
+            if len(v) > cnan[-1]:
+                ref = v.sum()/(len(v) - cnan[-1])
+            v[~isnan] -= ref
+
+            csum = np.zeros(len(v) + 1)
+            np.cumsum(v, out=csum[1:])
+            csq = np.zeros(len(v) + 1)
+            np.cumsum(v*v, out=csq[1:])
+
+            mean = (csum[stops] - csum[starts])/n
+            meansq = (csq[stops] - csq[starts])/n
+
+            results['mean'] = mean + ref
+            results['sd'] = np.sqrt(np.maximum(meansq - mean*mean, 0.))
+            results['rms'] = np.sqrt(np.maximum(meansq + 2.*ref*mean + ref*ref,
+                                                0.))
+            v[~isnan] += ref
+
+        if 'amean' in stats:
+            cabs = np.zeros(len(v) + 1)
+            np.cumsum(np.abs(v), out=cabs[1:])
+            results['amean'] = (cabs[stops] - cabs[starts])/n
+
+        for stat in ['mean', 'sd', 'rms', 'amean']:
+            if stat in results:
+                results[stat][hasnan] = np.nan
+
+        if set(stats) & set(['min', 'max', 'range']):
+            results['min'] = _segment_reduce(np.minimum, vec, starts, stops)
+            results['max'] = _segment_reduce(np.maximum, vec, starts, stops)
+            results['range'] = results['max'] - results['min']
+
+        for stat in stats:
+            x['%s_%s'%(prefix, stat)] = results[stat]
+
+    return x
+
+class EnsembleAccumulator(object):
+    """
+    Running ensemble statistics of curves resampled onto a common grid
+
+    Curves (e.g. the speed of every participant over a road section)
+    are added one at a time. Each is linearly interpolated onto the
+    grid and folded into a running mean and variance (Welford's
+    algorithm), so memory does not grow with the number of curves.
+    Accumulators built in different processes can be combined with
+    merge.
+
+    If bin edges are given a histogram is also kept at every grid
+    point so quantiles can be estimated. The quantiles are exact up to
+    the width of the bins.
+
+    Attributes
+    ----------
+    grid : np.ndarray
+        time or distance of each grid point
+
+    edges : None or np.ndarray
+        bin edges of the quantile histograms
+
+    count : np.ndarray
+        number of curves covering each grid point
+
+    Example
+    -------
+    >>> acc = EnsembleAccumulator(np.arange(0, 6604, 8))
+    >>> for daq in drives:
+    ...     fs = daq.dslice(d0, d1)
+    ...     dist = daq['VDS_Veh_Dist'][0, fs]
+    ...     acc.add(daq['VDS_Veh_Speed'][0, fs], dist - dist[0, 0])
+    >>> mean, ci = acc.mean(), 1.96*acc.sem()
+    """
+    def __init__(self, grid, edges=None):
+        """
+        Parameters
+        ----------
+        grid : array_like
+            increasing time or distance values to resample onto
+
+        edges : None or array_like
+            None -> don't keep quantile histograms
+            array_like -> increasing bin edges of the quantile
+            histograms. Values outside the edges are counted in the
+            first or last bin.
+        """
+        self.grid = np.array(grid, dtype=np.float64)
+        self.count = np.zeros(len(self.grid), dtype=np.int64)
+        self._mean = np.zeros(len(self.grid))
+        self._m2 = np.zeros(len(self.grid))
+
+        self.edges = None
+        self._hist = None
+        if edges is not None:
+            self.edges = np.array(edges, dtype=np.float64)
+            self._hist = np.zeros((len(self.grid), len(self.edges) - 1),
+                                  dtype=np.int64)
+
+    def add(self, y, x):
+        """
+        adds a curve
+
+        Parameters
+        ----------
+        y : array_like or Element
+            values of the curve (an Element must have one row)
+
+        x : array_like or Element
+            time or distance of each value. A running maximum is taken
+            so x is non-decreasing (like Daq.dslice). Grid points
+            outside of x are not covered by the curve.
+        """
+        y = np.asarray(y, dtype=np.float64)
+        x = np.asarray(x, dtype=np.float64)
+        if y.ndim == 2 and y.shape[0] == 1:
+            y = y[0]
+        if x.ndim == 2 and x.shape[0] == 1:
+            x = x[0]
+        if y.ndim != 1 or y.shape != x.shape:
+            raise ValueError('y and x must be 1-D with the same length')
+        if len(x) == 0:
+            return
+
+        x = np.maximum.accumulate(x)
+        covered = (self.grid >= x[0]) & (self.grid <= x[-1])
+        yi = np.interp(self.grid[covered], x, y)
+
+        # Welford update
+        n = self.count[covered] + 1
+        delta = yi - self._mean[covered]
+        mean = self._mean[covered] + delta/n
+        self._m2[covered] += delta*(yi - mean)
+        self._mean[covered] = mean
+        self.count[covered] = n
+
+        if self._hist is not None:
+            b = np.searchsorted(self.edges, yi, side='right') - 1
+            b = np.clip(b, 0, len(self.edges) - 2)
+            self._hist[np.flatnonzero(covered), b] += 1
+
+    def merge(self, other):
+        """
+        combines the curves of another accumulator with the same grid
+        (and edges) into this one
+
+        Returns
+        -------
+        self : EnsembleAccumulator
+        """
+        if not np.array_equal(self.grid, other.grid):
+            raise ValueError('grids do not match')
+
+        if (self.edges is None) != (other.edges is None) or \
+           (self.edges is not None and
+            not np.array_equal(self.edges, other.edges)):
+            raise ValueError('edges do not match')
+
+        # Chan et al. pairwise combination
+        n = self.count + other.count
+        nz = n > 0
+        na, nb = self.count[nz], other.count[nz]
+        delta = other._mean[nz] - self._mean[nz]
+
+        self._mean[nz] += delta*nb/n[nz]
+        self._m2[nz] += other._m2[nz] + delta*delta*na*nb/n[nz]
+        self.count = n
+
+        if self._hist is not None:
+            self._hist += other._hist
+
+        return self
+
+    def mean(self):
+        """
+        returns the ensemble mean at each grid point (nan where no
+        curve covers the grid)
+        """
+        mean = self._mean.copy()
+        mean[self.count == 0] = np.nan
+        return mean
+
+    def var(self, ddof=1):
+        """
+        returns the ensemble variance at each grid point
+
+        Parameters
+        ----------
+        ddof : int
+            delta degrees of freedom (the divisor is count - ddof)
+        """
+        d = (self.count - ddof).astype(np.float64)
+        d[d <= 0] = np.nan
+        return self._m2/d
+
+    def std(self, ddof=1):
+        """
+        returns the ensemble standard deviation at each grid point
+        """
+        return np.sqrt(self.var(ddof))
+
+    def sem(self):
+        """
+        returns the standard error of the ensemble mean at each grid
+        point (like scipy.stats.sem)
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(self.var(1)/self.count)
+
+    def quantile(self, q):
+        """
+        returns the q-th quantile at each grid point estimated from the
+        histograms (linear within a bin)
+
+        Parameters
+        ----------
+        q : float
+            quantile between 0 and 1
+        """
+        if self._hist is None:
+            raise RuntimeError('quantiles need the bin edges')
+
+        cum = np.cumsum(self._hist, axis=1)
+        target = q*self.count
+
+        # first bin where the cumulative count reaches the target
+        b = (cum < target[:, np.newaxis]).sum(1)
+        b = np.minimum(b, self._hist.shape[1] - 1)
+        rows = np.arange(len(self.grid))
+
+        below = np.where(b > 0, cum[rows, b - 1], 0)
+        inbin = self._hist[rows, b].astype(np.float64)
+        inbin[inbin == 0] = np.nan
+        frac = np.clip(np.nan_to_num((target - below)/inbin), 0., 1.)
+
+        lo, hi = self.edges[b], self.edges[b + 1]
+        x = lo + frac*(hi - lo)
+        x[self.count == 0] = np.nan
+        return x
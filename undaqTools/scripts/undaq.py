@@ -26,6 +26,12 @@ To convert all .daq files in subdirectories one level down using 6 CPUs and
 force rebuilding of existing hdf5 files::
     
     data_directory $ undaq.py */* -n 6 -r
+
+When -n is not given the number of CPUs is picked so the projected peak 
+memory of the largest file (see Daq.plan) fits the available memory (or 
+the -m budget in GB)::
+
+    data_directory $ undaq.py */* -m 24
 """
 
 import argparse
@@ -37,6 +43,50 @@ import warnings
 
 import undaqTools
     
+def available_memory():
+    """
+    returns the available memory in bytes or None if it can't be found
+    """
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except IOError:
+        pass
+    return None
+
+def plan_numcpu(daq_files, elemfile=None, maxmem=None):
+    """
+    returns the number of cpus to convert daq_files with so the projected
+    peak memory of the largest file times the number of cpus fits in
+    maxmem bytes (defaults to the available memory)
+    """
+    numcpu = max(1, min(multiprocessing.cpu_count(), len(daq_files)))
+    if len(daq_files) == 0:
+        return numcpu
+    
+    if maxmem is None:
+        maxmem = available_memory()
+    if maxmem is None:
+        return numcpu
+
+    elemlist = None
+    if elemfile is not None:
+        daq = undaqTools.Daq()
+        daq.load_elemlist_fromfile(elemfile)
+        elemlist = daq.elemlist
+
+    largest = max(daq_files, key=lambda daq_file: os.stat(daq_file).st_size)
+    with warnings.catch_warnings(record=True) as ws:
+        plan = undaqTools.Daq.plan(largest, elemlist)
+
+    print('\nLargest file: %s'%largest)
+    print('  projected peak memory: {:,.0f} MB'.format(plan.peak/(1024*1024.)))
+    print('  estimated unpack time: %.1f s'%plan.seconds)
+
+    return max(1, min(numcpu, int(maxmem//max(plan.peak, 1))))
+    
 # define a function to convert a daq to hdf5
 def convert_daq(tupledArgs):
     """
@@ -92,7 +142,9 @@ if __name__ == '__main__':
     parser.add_argument('path', type=str,   
                         help='Path for glob             ("*")')
     parser.add_argument('-n', '--numcpu',   type=int, 
-                        help='Number of cpus in pool    (1)')
+                        help='Number of cpus in pool    (planned)')
+    parser.add_argument('-m', '--maxmem',   type=float, 
+                        help='Memory budget in GB       (available)')
     parser.add_argument('-o', '--outtype',   
                         help='Output type               ([hd5], mat)')
     parser.add_argument('-e', '--elemfile', 
@@ -104,15 +156,14 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     path = args.path
-    numcpu = (args.numcpu, 1)[args.numcpu is None]
     ext = (args.outtype, 'hdf5')[args.outtype is None]
     ext = ext.strip().replace('.','').replace('hd5','hdf5')
     elemfile = args.elemfile
     rebuild = args.rebuild
     debug = args.debug
-
-    # parallel worker pool
-    pool = multiprocessing.Pool(numcpu)
+    maxmem = args.maxmem
+    if maxmem is not None:
+        maxmem *= 1024**3
     
     # find all output files and all the daq files
     # we don't want to convert the daq files unless we have to
@@ -143,6 +194,17 @@ if __name__ == '__main__':
             [(daq, ext, elemfile) for daq in daq_files \
              if daq.endswith(ext) not in out_files]
     
+    # the number of cpus we can use depends on how much memory
+    # converting a file takes
+    if args.numcpu is None:
+        numcpu = plan_numcpu([tupledArg[0] for tupledArg in daqs2convert],
+                             elemfile, maxmem)
+    else:
+        numcpu = args.numcpu
+
+    # parallel worker pool
+    pool = multiprocessing.Pool(numcpu)
+    
     # ready to roll.
     print('\n\ndebug =', debug)
     print('rebuild =', rebuild)
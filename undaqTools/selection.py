@@ -0,0 +1,150 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import os
+import re
+
+from fnmatch import translate
+
+from undaqTools.daqindex import _template_dtype
+
+# maximum number of cached selections and layout plans
+_cache_size = 64
+
+_selections = {}
+_plans = {}
+
+class ElemSelection(object):
+    """
+    Compiled wildcard element selection
+
+    The wildcards of an elemlist are translated to a single regular
+    expression so a name is checked against all of them with one match.
+    Matching follows fnmatch (case is normalised the same way).
+
+    Use ElemSelection.compile to reuse selections of the same elemlist.
+    """
+    def __init__(self, wclist=None):
+        """
+        Parameters
+        ----------
+        wclist : None or list_like
+            None -> everything is selected
+            list_like -> wildcard patterns
+        """
+        if wclist is None:
+            self.wclist = None
+            self._regex = None
+        else:
+            self.wclist = tuple(wclist)
+            pattern = '|'.join('(?:%s)'%translate(os.path.normcase(wc))
+                               for wc in self.wclist)
+            self._regex = re.compile(pattern or '(?!)')
+
+    @classmethod
+    def compile(cls, wclist=None):
+        """
+        returns the (cached) ElemSelection of wclist
+        """
+        key = (None if wclist is None else tuple(wclist))
+        selection = _selections.get(key)
+        if selection is None:
+            if len(_selections) >= _cache_size:
+                _selections.clear()
+            selection = _selections[key] = cls(wclist)
+        return selection
+
+    def match(self, name):
+        """
+        returns True if name matches one of the wildcards
+        """
+        if self._regex is None:
+            return True
+        return self._regex.match(os.path.normcase(name)) is not None
+
+    def mask(self, names):
+        """
+        returns list of bools specifying which names match
+        """
+        if self._regex is None:
+            return [True for name in names]
+        return [self.match(name) for name in names]
+
+class LayoutPlan(object):
+    """
+    Everything about decoding frames that only depends on the header
+    and the elemlist
+
+    Attributes
+    ----------
+    key : tuple
+        the header contents the plan was built for
+
+    mask : list of bools
+        specifies which elements (by id) are selected
+
+    templates : dict
+        (ids, numitems) -> structured dtype of a frame layout
+        (see undaqTools.daqindex._template_dtype). Filled as layouts
+        are found.
+    """
+    def __init__(self, key, mask, _header):
+        self.key = key
+        self.mask = mask
+        self.templates = {}
+        self._header = _header
+
+    def template(self, ids, numitems):
+        """
+        returns the (cached) structured dtype of frames with the
+        cells ids holding numitems values
+        """
+        tkey = (tuple(ids), tuple(numitems))
+        dtype = self.templates.get(tkey)
+        if dtype is None:
+            dtype = self.templates[tkey] = \
+                _template_dtype(ids, numitems, self._header)
+        return dtype
+
+def _header_key(_header):
+    """
+    returns a hashable summary of the element header
+    """
+    return (tuple(_header.name),
+            tuple(_header.numvalues),
+            tuple(_header.rate),
+            tuple(_header.type),
+            tuple(_header.varrateflag))
+
+def layout_plan(_header, elemlist=None):
+    """
+    layout_plan(_header[, elemlist=None])
+
+    returns the LayoutPlan of a header and elemlist. Plans are cached so
+    drives recorded with the same simulator configuration share one.
+
+    Parameters
+    ----------
+    _header : Header
+        element header information (Daq._header)
+
+    elemlist : None or list_like
+         None -> select all elements
+         list_like -> select names that match list
+
+    Returns
+    -------
+    plan : LayoutPlan
+    """
+    selection = ElemSelection.compile(elemlist)
+    key = (_header_key(_header), selection.wclist)
+
+    plan = _plans.get(key)
+    if plan is None:
+        if len(_plans) >= _cache_size:
+            _plans.clear()
+        plan = _plans[key] = \
+            LayoutPlan(key, selection.mask(_header.name), _header)
+    return plan
@@ -11,7 +11,11 @@ import glob
 import os
 import unittest
 
-from undaqTools.daq import Daq, stat, Info
+import numpy as np
+from numpy.testing import assert_array_equal, assert_array_almost_equal
+
+from undaqTools.daq import Daq, stat, Info, Frame
+from undaqTools.catalog import stat_many
 from undaqTools.element import Element, fslice, FrameSlice, findex, FrameIndex
 
 test_file = 'data reduction_20130204125617.daq'
@@ -23,6 +27,60 @@ class Test_stat(unittest.TestCase):
         info = stat(os.path.join('data', test_file))
         self.assertEqual(repr(info), repr(eval(repr(info))))
                     
+class Test_stat_many(unittest.TestCase):
+    def tearDown(self):
+        time.sleep(.1)
+        for tmp_file in glob.glob('./tmp/*'):
+            os.remove(tmp_file)
+
+    def test0(self):
+        global test_file
+        filename = os.path.join('data', test_file)
+        catalog = os.path.join('tmp', 'catalog.sqlite')
+
+        daq = Daq()
+        daq.read(filename, process_dynobjs=False)
+
+        drives = stat_many([filename, filename + '.missing'],
+                           catalog=catalog)
+        self.assertTrue(drives[1] is None)
+
+        drive = drives[0]
+        self.assertEqual(drive.info, stat(filename))
+        self.assertEqual(sorted(e.name for e in drive.elements),
+                         sorted(k for k in daq if not k.endswith('_Fixed')))
+
+        # the estimate should be close
+        nframes = len(daq.frame.frame)
+        self.assertTrue(abs(drive.nframes - nframes) < 0.05*nframes)
+        self.assertAlmostEqual(drive.duration,
+                               drive.nframes/float(daq.info.frequency))
+
+        # second time around it comes out of the catalog
+        self.assertEqual(stat_many([filename], catalog=catalog), [drive])
+                    
+class Test_plan(unittest.TestCase):
+    def test0(self):
+        global test_file
+        filename = os.path.join('data', test_file)
+
+        plan = Daq.plan(filename, ['VDS*', 'CIS*'])
+
+        daq = Daq()
+        daq.read(filename, ['VDS*', 'CIS*'], process_dynobjs=False)
+        
+        self.assertEqual(sorted(plan.elements.keys()),
+                         sorted(k for k in daq if not k.endswith('_Fixed')))
+
+        nframes = len(daq.frame.frame)
+        self.assertTrue(abs(plan.nframes - nframes) < 0.05*nframes)
+
+        nbytes = sum(daq[k].nbytes + daq[k].frames.nbytes
+                     for k in plan.elements)
+        self.assertTrue(abs(plan.nbytes - nbytes) < 0.05*nbytes)
+        self.assertTrue(plan.peak >= plan.nbytes)
+        self.assertTrue(plan.seconds > 0.)
+        
 class Test_match_keys(unittest.TestCase):
            
     def test0(self):
@@ -173,6 +231,160 @@ class Test_setitem(unittest.TestCase):
         daq = Daq()
         self.assertRaises(KeyError, daq.__setitem__, None, elem)
         
+class Test_interpolate(unittest.TestCase):
+    def setUp(self):
+        # frames 3 and 4 are missing
+        frames = [1, 2, 5, 6]
+        self.daq = daq = Daq()
+        daq.f0, daq.fend = 1, 6
+        daq.frame = Frame(code=[0]*4, frame=np.array(frames), count=[3]*4)
+        daq['VDS_Veh_Speed'] = \
+            Element([[0., 1., 4., 5.], [0., 2., 8., 10.]], frames,
+                    dtype='f', rate=1, name='VDS_Veh_Speed')
+        daq['CIS_Cruise_Control'] = \
+            Element([10, 20, 50, 60], frames,
+                    dtype='i', rate=1, name='CIS_Cruise_Control')
+        daq['SCC_DynObj_SolId'] = \
+            Element([7, 8, 9, 9], frames,
+                    dtype='i', rate=1, name='SCC_DynObj_SolId')
+
+    def test0(self):
+        daq = self.daq
+        daq._interpolate_missing_frames()
+
+        assert_array_equal(daq.frame.frame, range(1, 7))
+
+        speed = daq['VDS_Veh_Speed']
+        self.assertEqual(speed.dtype, np.float32)
+        assert_array_almost_equal(speed, [[0, 1, 2, 3, 4, 5],
+                                          [0, 2, 4, 6, 8, 10]])
+        assert_array_equal(speed.frames, range(1, 7))
+        assert_array_equal(speed.interpolated, [0, 0, 1, 1, 0, 0])
+
+        # integers are rounded
+        cruise = daq['CIS_Cruise_Control']
+        self.assertEqual(cruise.dtype, np.int32)
+        assert_array_equal(cruise, [[10, 20, 30, 40, 50, 60]])
+        self.assertTrue(cruise.interpolated is speed.interpolated)
+
+        # categorical cells keep their frames
+        solid = daq['SCC_DynObj_SolId']
+        self.assertEqual(solid.rate, -2)
+        assert_array_equal(solid.frames, [1, 2, 5, 6])
+        self.assertTrue(solid.interpolated is None)
+
+    def test1(self):
+        daq = self.daq
+        daq._interpolate_missing_frames(ffill=True)
+
+        assert_array_almost_equal(daq['VDS_Veh_Speed'][0],
+                                  [0, 1, 2, 3, 4, 5])
+        assert_array_equal(daq['CIS_Cruise_Control'],
+                           [[10, 20, 20, 20, 50, 60]])
+
+        solid = daq['SCC_DynObj_SolId']
+        self.assertEqual(solid.rate, 1)
+        assert_array_equal(solid, [[7, 8, 8, 8, 9, 9]])
+        assert_array_equal(solid.interpolated[1:5], [0, 1, 1, 0])
+
+class Test_tslice_dslice(unittest.TestCase):
+    def setUp(self):
+        frames = np.arange(600, 610)
+        self.daq = daq = Daq()
+        daq.info = daq.info._replace(frequency=60)
+        daq.f0, daq.fend = 600, 609
+        daq.frame = Frame(code=[0]*10, frame=frames, count=[2]*10)
+        daq['VDS_Veh_Speed'] = \
+            Element(np.arange(10.), frames,
+                    dtype='f', rate=1, name='VDS_Veh_Speed')
+
+        # backs up between frames 604 and 606
+        daq['VDS_Veh_Dist'] = \
+            Element([0., 1., 2., 3., 4., 3.5, 3.8, 5., 6., 7.], frames,
+                    dtype='f', rate=1, name='VDS_Veh_Dist')
+
+    def test_tslice(self):
+        daq = self.daq
+        self.assertEqual(daq.tslice(10., 10.05), FrameSlice(600, 603, None))
+        self.assertEqual(daq.tslice(10.05), FrameSlice(None, 603, None))
+        self.assertEqual(daq.tslice(10.05, None),
+                         FrameSlice(603, None, None))
+
+        speed = daq['VDS_Veh_Speed'][0, daq.tslice(601/60., 604/60.)]
+        assert_array_equal(speed.frames, [601, 602, 603])
+
+    def test_tslice_frequency(self):
+        daq = self.daq
+        daq.info = daq.info._replace(frequency=0)
+        with self.assertRaises(ValueError):
+            daq.tslice(0., 1.)
+
+    def test_dslice(self):
+        daq = self.daq
+        self.assertEqual(daq.dslice(2., 5.), FrameSlice(602, 607, None))
+        self.assertEqual(daq.dslice(3.6, 6.5), FrameSlice(604, 609, None))
+        self.assertEqual(daq.dslice(None, 100.), FrameSlice(None, 610, None))
+
+        speed = daq['VDS_Veh_Speed'][0, daq.dslice(2., 5.)]
+        assert_array_equal(speed.frames, [602, 603, 604, 605, 606])
+
+    def test_dslice_cache(self):
+        daq = self.daq
+        daq.dslice(2., 5.)
+        index = daq._monotone['VDS_Veh_Dist'][1]
+        daq.dslice(3., 4.)
+        self.assertTrue(daq._monotone['VDS_Veh_Dist'][1] is index)
+
+        # replacing the Element rebuilds the index
+        daq['VDS_Veh_Dist'] = \
+            Element(np.arange(10.)*10., daq.frame.frame,
+                    dtype='f', rate=1, name='VDS_Veh_Dist')
+        self.assertEqual(daq.dslice(20., 50.), FrameSlice(602, 605, None))
+
+class Test_to_matrix(unittest.TestCase):
+    def setUp(self):
+        frames = np.arange(10, 16)
+        self.daq = daq = Daq()
+        daq.f0, daq.fend = 10, 15
+        daq.frame = Frame(code=[0]*6, frame=frames, count=[3]*6)
+        daq['VDS_Veh_Speed'] = \
+            Element(np.arange(6.), frames,
+                    dtype='f', rate=1, name='VDS_Veh_Speed')
+        daq['VDS_Chassis_CG_Position'] = \
+            Element(np.arange(18).reshape(3, 6), frames,
+                    dtype='i', rate=1, name='VDS_Chassis_CG_Position')
+        daq['SCC_Lane_Depart_Warn'] = \
+            Element([[1, 2], [3, 4]], [12, 14],
+                    dtype='i', rate=-1, name='SCC_Lane_Depart_Warn')
+
+    def test0(self):
+        x, columns = self.daq.to_matrix([('VDS_Veh_Speed', None),
+                                         ('VDS_Chassis_CG_Position', [0, 2]),
+                                         ('SCC_Lane_Depart_Warn', 1)])
+
+        self.assertEqual(columns, [('VDS_Veh_Speed', 0),
+                                   ('VDS_Chassis_CG_Position', 0),
+                                   ('VDS_Chassis_CG_Position', 2),
+                                   ('SCC_Lane_Depart_Warn', 1)])
+        self.assertEqual(x.shape, (6, 4))
+        self.assertTrue(x.flags.f_contiguous)
+        assert_array_equal(x[:, 0], range(6))
+        assert_array_equal(x[:, 1], range(6))
+        assert_array_equal(x[:, 2], range(12, 18))
+        assert_array_equal(x[:, 3], [np.nan, np.nan, 3, 3, 4, 4])
+
+    def test_fslice(self):
+        x, columns = self.daq.to_matrix([('SCC_Lane_Depart_Warn', None),
+                                         ('VDS_Veh_Speed', 0)],
+                                        fslice(11, 15), dtype=np.int64,
+                                        fill=0)
+
+        self.assertEqual(x.dtype, np.int64)
+        assert_array_equal(x, [[0, 0, 1],
+                               [1, 3, 2],
+                               [1, 3, 3],
+                               [2, 4, 4]])
+
 class Test_load_elemlist_fromfile(unittest.TestCase):
     def test0(self):
 
@@ -186,8 +398,13 @@ class Test_load_elemlist_fromfile(unittest.TestCase):
 def suite():
     return unittest.TestSuite((
 ##            unittest.makeSuite(Test_stat),
+            unittest.makeSuite(Test_stat_many),
+            unittest.makeSuite(Test_plan),
 ##            unittest.makeSuite(Test_match_keys),
             unittest.makeSuite(Test_keys_summary),
+            unittest.makeSuite(Test_interpolate),
+            unittest.makeSuite(Test_tslice_dslice),
+            unittest.makeSuite(Test_to_matrix),
 ##            unittest.makeSuite(Test_etc),
 ##            unittest.makeSuite(Test_setitem),
 ##            unittest.makeSuite(Test_load_elemlist_fromfile),
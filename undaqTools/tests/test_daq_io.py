@@ -8,7 +8,9 @@ import os
 import time
 import unittest
 import warnings
+import weakref
 
+import h5py
 import numpy as np
 from numpy.testing import assert_array_equal, \
                           assert_array_almost_equal
@@ -16,9 +18,11 @@ from scipy import io as sio
 
 from six import string_types
 
-from undaqTools import Daq
+from undaqTools import Daq, iter_daq
+from undaqTools.daq import _hd5_searchsorted
+from undaqTools.element import findex, RaggedElement
 from undaqTools.deprecated import old_convert_daq
-from undaqTools.misc.base import _flatten
+from undaqTools.misc.base import _flatten, _searchsorted
 
 test_file = 'data reduction_20130204125617.daq'
 partial = 'Left_11_20130429102407.daq'
@@ -78,6 +82,18 @@ class Test_load(unittest.TestCase):
         old_daq = old_convert_daq.read_file(os.path.join('data', test_file))
         self.__assert_old_daq_equals_daq(old_daq, daq)
 
+    def test_load_shared_frames(self):
+        global test_file
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+
+        # the non-CSSDC Elements share one frame axis
+        frames = daq['VDS_Veh_Speed'].frames
+        for elem in daq.values():
+            if not elem.isCSSDC():
+                self.assertTrue(np.may_share_memory(elem.frames, frames))
+        assert_array_equal(frames, daq.frame.frame)
+
     def test_load_with_elemlist(self):
         global test_file
         
@@ -155,6 +171,13 @@ class Test_load(unittest.TestCase):
         daq2.read_hd5(os.path.join('tmp', 'partial.hdf5'))
 
         assert_Daqs_equal(self, daq, daq2)        
+
+        # interpolated Elements keep their type and mask
+        speed = daq2['VDS_Veh_Speed']
+        self.assertEqual(speed.dtype, np.float32)
+        self.assertTrue(speed.interpolated.any())
+        assert_array_equal(speed.interpolated,
+                           daq['VDS_Veh_Speed'].interpolated)
     
     def __assert_old_daq_equals_daq(self, old_daq, daq):
 
@@ -339,6 +362,206 @@ class Test_hd5(unittest.TestCase):
 
         assert_Daqs_equal(self, daq, daq2)
         
+    def test_readwrite_layout(self):
+        global test_file
+        hdf5file = os.path.join('tmp', test_file[:-4]+'_layout.hdf5')
+
+        daq = Daq()
+        daq.read(os.path.join('data', test_file))
+
+        for compression in [None, 'gzip', 'lzf']:
+            daq.write_hd5(hdf5file, compression=compression,
+                          chunk_frames=600, cssdc_chunk=16)
+
+            root = h5py.File(hdf5file, 'r')
+            layout = root['data'].attrs
+            self.assertEqual(layout['compression'],
+                             (compression, '')[compression is None])
+            self.assertEqual(layout['chunk_frames'], 600)
+            self.assertEqual(layout['cssdc_chunk'], 16)
+
+            speed = root['data/VDS_Veh_Speed']
+            self.assertEqual(speed.chunks, (1, 600))
+            self.assertEqual(speed.compression, compression)
+            self.assertEqual(root['frame/frame'].chunks, (600,))
+            self.assertEqual(root['data/CIS_Turn_Signal_Frames'].chunks,
+                             (16,))
+            root.close()
+
+            daq2 = Daq()
+            daq2.read_hd5(hdf5file)
+            assert_Daqs_equal(self, daq, daq2)
+
+        # contiguous
+        daq.write_hd5(hdf5file, compression=None, chunk_frames=None,
+                      cssdc_chunk=None)
+        root = h5py.File(hdf5file, 'r')
+        self.assertEqual(root['data/VDS_Veh_Speed'].chunks, None)
+        self.assertEqual(root['data'].attrs['chunk_frames'], '')
+        root.close()
+
+    def test_open_hd5(self):
+        global test_file
+        hdf5file = os.path.join('tmp', test_file[:-4]+'_lazy.hdf5')
+
+        daq = Daq()
+        daq.read(os.path.join('data', test_file))
+        daq.write_hd5(hdf5file)
+
+        daq2 = Daq()
+        daq2.open_hd5(hdf5file)
+
+        # nothing has been read
+        self.assertEqual(dict.__len__(daq2), 0)
+        self.assertEqual(sorted(daq2.keys()), sorted(daq.keys()))
+        assert_array_equal(daq2.frame.frame, daq.frame.frame)
+
+        assert_Daqs_equal(self, daq, daq2)
+        daq2.close()
+
+    def test_open_hd5_lru(self):
+        global test_file
+        hdf5file = os.path.join('tmp', test_file[:-4]+'_lru.hdf5')
+
+        daq = Daq()
+        daq.read(os.path.join('data', test_file))
+        daq.write_hd5(hdf5file)
+
+        speed = daq['VDS_Veh_Speed']
+        daq2 = Daq()
+        daq2.open_hd5(hdf5file, max_memory=2*speed.nbytes)
+
+        # same size as VDS_Veh_Speed
+        daq2['VDS_Veh_Speed']
+        daq2['VDS_Veh_Heading']
+        self.assertTrue(dict.__contains__(daq2, 'VDS_Veh_Speed'))
+
+        # VDS_Veh_Heading is the least recently used
+        daq2['VDS_Veh_Speed']
+        daq2['VDS_Frame_Count']
+        self.assertTrue(dict.__contains__(daq2, 'VDS_Veh_Speed'))
+        self.assertFalse(dict.__contains__(daq2, 'VDS_Veh_Heading'))
+        self.assertTrue(daq2._lru_bytes <= 2*speed.nbytes)
+
+        # evicted Elements are read again
+        self.assertTrue('VDS_Veh_Heading' in daq2)
+        assert_array_equal(daq2['VDS_Veh_Heading'], daq['VDS_Veh_Heading'])
+
+        daq2.close()
+        self.assertRaises(KeyError, daq2.__getitem__, 'CIS_Turn_Signal')
+
+    def test_open_hd5_lru_dslice(self):
+        global test_file
+        hdf5file = os.path.join('tmp', test_file[:-4]+'_lru_dslice.hdf5')
+
+        daq = Daq()
+        daq.read(os.path.join('data', test_file))
+        daq.write_hd5(hdf5file)
+
+        speed = daq['VDS_Veh_Speed']
+        daq2 = Daq()
+        daq2.open_hd5(hdf5file, max_memory=2*speed.nbytes)
+
+        # the dslice index doesn't keep evicted Elements alive
+        daq2.dslice(0., 1., name='VDS_Veh_Heading')
+        ref = weakref.ref(daq2['VDS_Veh_Heading'])
+        daq2['VDS_Veh_Speed']
+        daq2['VDS_Frame_Count']
+        self.assertFalse(dict.__contains__(daq2, 'VDS_Veh_Heading'))
+        self.assertFalse('VDS_Veh_Heading' in daq2._monotone)
+        self.assertTrue(ref() is None)
+
+        daq2.close()
+
+    def test_frame_attrs(self):
+        global test_file
+        hdf5file = os.path.join('tmp', test_file[:-4]+'_frames.hdf5')
+
+        daq = Daq()
+        daq.read(os.path.join('data', test_file))
+        daq.write_hd5(hdf5file, chunk_frames=100, cssdc_chunk=4)
+
+        frames = np.array(daq.frame.frame)
+        root = h5py.File(hdf5file, 'r')
+
+        ds = root['frame/frame']
+        self.assertEqual(ds.attrs['first_frame'], frames[0])
+        self.assertEqual(ds.attrs['last_frame'], frames[-1])
+        self.assertEqual(ds.attrs['contiguous'], 1)
+        assert_array_equal(ds.attrs['block_frames'], frames[::100])
+
+        ds = root['data/CIS_Turn_Signal_Frames']
+        self.assertEqual(ds.attrs['contiguous'], 0)
+        self.assertEqual(ds.attrs['block'], 4)
+
+        for name in ['frame/frame', 'data/CIS_Turn_Signal_Frames']:
+            ds = root[name]
+            a = ds[:]
+            for f in list(a[::7]) + [a[0] - 10, a[0], a[-1], a[-1] + 10,
+                                     a[3] + 0.5, a[-2] + 1]:
+                self.assertEqual(_hd5_searchsorted(ds, f),
+                                 _searchsorted(a, f))
+        root.close()
+
+        # files without the metadata read all the frames
+        old_file = os.path.join('tmp', test_file[:-4]+'_frames_old.hdf5')
+        daq.write_hd5(old_file, chunk_frames=100, cssdc_chunk=4)
+        root = h5py.File(old_file, 'a')
+        for ds in [root['frame/frame']] + \
+                  [v for k, v in root['data'].items()
+                   if k.endswith('_Frames')]:
+            for attr in ['first_frame', 'last_frame', 'contiguous',
+                         'block', 'block_frames']:
+                del ds.attrs[attr]
+        root.close()
+
+        for f0, fend in [(frames[1000], frames[1500]),
+                         (frames[0] - 5, frames[10]),
+                         (frames[-10], frames[-1] + 5)]:
+            daq2 = Daq()
+            daq2.read_hd5(hdf5file, f0=f0, fend=fend)
+
+            daq3 = Daq()
+            daq3.read_hd5(old_file, f0=f0, fend=fend)
+            assert_Daqs_equal(self, daq2, daq3)
+            for k in daq2:
+                assert_array_equal(daq2[k].frames, daq3[k].frames)
+
+    def test_readwrite_ragged(self):
+        global test_file
+        hdf5file = os.path.join('tmp', test_file[:-4]+'_ragged.hdf5')
+
+        daq = Daq()
+        daq.read(os.path.join('data', test_file))
+
+        # 0, 1 or 2 values a frame
+        frames = np.array(daq.frame.frame)
+        counts = np.arange(len(frames))%3
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+        daq['SCC_Collision_List'] = \
+            RaggedElement(np.arange(offsets[-1]), offsets, frames,
+                          rate=1, dtype='i', varrateflag=1,
+                          name='SCC_Collision_List')
+        daq.write_hd5(hdf5file)
+
+        daq2 = Daq()
+        daq2.read_hd5(hdf5file)
+
+        x = daq2['SCC_Collision_List']
+        self.assertTrue(isinstance(x, RaggedElement))
+        assert_array_equal(x.values, np.arange(offsets[-1]))
+        assert_array_equal(x.offsets, offsets)
+        assert_array_equal(x.frames, frames)
+
+        # frame range
+        daq3 = Daq()
+        daq3.read_hd5(hdf5file, f0=frames[4], fend=frames[6])
+
+        x = daq3['SCC_Collision_List']
+        assert_array_equal(x.frames, frames[4:7])
+        assert_array_equal(x.counts, [1, 2, 0])
+        assert_array_equal(x[1], daq['SCC_Collision_List'][5])
+
     def test_readwrite_with_elemlist(self):
         global test_file
         hdf5file = os.path.join('tmp', test_file[:-4]+'_2.hdf5')
@@ -401,11 +624,200 @@ class Test_hd5(unittest.TestCase):
 
         assert_Daqs_equal(self, daq, daq2)
 
+class Test_load_range(unittest.TestCase):
+    def tearDown(self):
+        time.sleep(.1)
+        for idx_file in glob.glob('./data/*.daqidx'):
+            os.remove(idx_file)
+
+    def test_load_f0fend(self):
+        global test_file
+        
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+        n = len(daq.frame.frame)
+        f0, fend = daq.frame.frame[n//3], daq.frame.frame[2*n//3]
+
+        for index in [False, True]:
+            daq2 = Daq()
+            daq2.read(os.path.join('data', test_file), process_dynobjs=False,
+                      f0=f0, fend=fend, index=index)
+
+            self.assertEqual(daq2.f0, f0)
+            self.assertEqual(daq2.fend, fend)
+            
+            indx = np.flatnonzero(np.logical_and(daq.frame.frame >= f0,
+                                                 daq.frame.frame <= fend))
+            assert_array_equal(daq.frame.frame[indx], daq2.frame.frame)
+            
+            for k in daq:
+                if daq[k].isCSSDC() or k.startswith('SCC_Spline_Lane'):
+                    continue
+
+                assert_array_equal(daq[k][:, indx], daq2[k])
+                assert_array_equal(daq[k].frames[indx], daq2[k].frames)
+
+    def test_load_f0_cssdc_state(self):
+        global test_file
+        
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+        f0 = daq.frame.frame[len(daq.frame.frame)//2]
+
+        daq2 = Daq()
+        daq2.read(os.path.join('data', test_file), process_dynobjs=False,
+                  f0=f0)
+
+        for k in daq:
+            if not daq[k].isCSSDC() or daq[k].frames[0] > f0:
+                continue
+
+            # the state before the range is carried in
+            self.assertTrue(daq2[k].frames[0] <= f0)
+            assert_array_equal(daq[k][:, findex(f0)],
+                               daq2[k][:, findex(f0)])
+        
+class Test_workers(unittest.TestCase):
+    def test_load_workers(self):
+        global test_file
+        
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+
+        daq2 = Daq()
+        daq2.read(os.path.join('data', test_file), process_dynobjs=False,
+                  workers=2)
+
+        assert_array_equal(daq.frame.frame, daq2.frame.frame)
+        assert_array_equal(daq.frame.code, daq2.frame.code)
+        assert_array_equal(daq.frame.count, daq2.frame.count)
+        
+        for k in daq:
+            assert_array_equal(daq[k], daq2[k])
+            assert_array_equal(daq[k].frames, daq2[k].frames)
+
+class Test_spill(unittest.TestCase):
+    def tearDown(self):
+        time.sleep(.1)
+        for tmp_file in glob.glob('./tmp/*'):
+            os.remove(tmp_file)
+
+    def test_load_max_memory(self):
+        global test_file
+        
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+
+        daq2 = Daq()
+        daq2.read(os.path.join('data', test_file), process_dynobjs=False,
+                  max_memory='64KB', spill_dir='tmp')
+
+        def spilled(elem):
+            base = elem
+            while base is not None:
+                if isinstance(base, np.memmap):
+                    return True
+                base = base.base
+            return False
+
+        # the big ones are backed by scratch files, the small ones aren't
+        self.assertTrue(spilled(daq2['SCC_DynObj_Name']))
+        self.assertFalse(spilled(daq2['VDS_Veh_Speed']))
+        
+        for k in daq:
+            self.assertEqual(daq[k].dtype, daq2[k].dtype)
+            assert_array_equal(daq[k], daq2[k])
+            assert_array_equal(daq[k].frames, daq2[k].frames)
+
+class Test_iter(unittest.TestCase):
+    def test_iter_daq(self):
+        global test_file
+        
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+
+        chunks = list(iter_daq(os.path.join('data', test_file),
+                               chunk_frames=1000))
+
+        self.assertTrue(all(len(c.frame.frame) <= 1000 for c in chunks))
+        assert_array_equal(daq.frame.frame,
+                           np.concatenate([c.frame.frame for c in chunks]))
+        
+        for k in daq:
+            if daq[k].isCSSDC() or k.startswith('SCC_Spline_Lane'):
+                continue
+
+            assert_array_equal(daq[k],
+                np.concatenate([c[k].toarray() for c in chunks], axis=1))
+
+    def test_iter_daq_cssdc_state(self):
+        global test_file
+        
+        daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+
+        for chunk in iter_daq(os.path.join('data', test_file),
+                              chunk_frames=1000):
+            f0 = chunk.frame.frame[0]
+            for k in chunk:
+                if not daq[k].isCSSDC() or daq[k].frames[0] > f0:
+                    continue
+
+                assert_array_equal(daq[k][:, findex(f0)],
+                                   chunk[k][:, findex(f0)])
+            
+class Test_mmap(unittest.TestCase):
+    def tearDown(self):
+        time.sleep(.1)
+        for idx_file in glob.glob('./data/*.daqidx'):
+            os.remove(idx_file)
+
+    def test_lazy(self):
+        global test_file
+        
+        daq = Daq()
+        daq.open_mmap(os.path.join('data', test_file))
+
+        # nothing is materialised until it is accessed
+        self.assertEqual(dict.__len__(daq), 0)
+        self.assertTrue('VDS_Veh_Speed' in daq)
+
+        daq['VDS_Veh_Speed']
+        self.assertEqual(dict.__len__(daq), 1)
+        
+    def test_open_mmap(self):
+        global test_file
+        
+        daq = Daq()
+        with warnings.catch_warnings(record=True) as w:
+            daq.read(os.path.join('data', test_file),
+                     process_dynobjs=False)
+
+        daq2 = Daq()
+        daq2.open_mmap(os.path.join('data', test_file))
+
+        self.assertEqual(daq.f0, daq2.f0)
+        self.assertEqual(daq.fend, daq2.fend)
+        assert_array_equal(daq.frame.frame, daq2.frame.frame)
+        
+        for k in daq:
+            if k == 'SCC_Spline_Lane_Deviation_Fixed':
+                continue
+
+            self.assertEqual(daq[k].dtype, daq2[k].dtype)
+            assert_array_equal(daq[k], daq2[k])
+            assert_array_equal(daq[k].frames, daq2[k].frames)
+
 def suite():
     return unittest.TestSuite((
             unittest.makeSuite(Test_load),
             unittest.makeSuite(Test_mat),
-            unittest.makeSuite(Test_hd5)
+            unittest.makeSuite(Test_hd5),
+            unittest.makeSuite(Test_load_range),
+            unittest.makeSuite(Test_workers),
+            unittest.makeSuite(Test_spill),
+            unittest.makeSuite(Test_iter),
+            unittest.makeSuite(Test_mmap)
                               ))
 
 if __name__ == "__main__":
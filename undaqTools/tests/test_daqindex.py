@@ -0,0 +1,159 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import glob
+import os
+import time
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from undaqTools import Daq, DaqIndex
+from undaqTools.daqindex import sidecar
+
+test_file = 'data reduction_20130204125617.daq'
+
+class Test_build(unittest.TestCase):
+    def setUp(self):
+        global test_file
+        self.daq = daq = Daq()
+        daq.read_daq(os.path.join('data', test_file), loaddata=False)
+        self.index = DaqIndex.build(daq.info.filename, daq.cursor, daq._header)
+
+    def test_frames(self):
+        global test_file
+        daq = Daq()
+        daq.read_daq(os.path.join('data', test_file))
+
+        assert_array_equal(daq.frame.frame, self.index.frame)
+        assert_array_equal(daq.frame.count,
+                           [len(self.index.elemids(i))
+                            for i in xrange(len(self.index))])
+        self.assertTrue(self.index.terminated)
+        self.assertTrue(self.index.partial is None)
+
+    def test_counts(self):
+        global test_file
+        daq = Daq()
+        daq.read_daq(os.path.join('data', test_file),
+                     process_dynobjs=False)
+
+        for name, i in zip(self.daq._header.name, self.daq._header.id):
+            if daq[name].isCSSDC():
+                self.assertEqual(self.index.counts[i], len(daq[name].frames))
+            else:
+                self.assertEqual(self.index.counts[i], len(self.index))
+
+    def test_offsets(self):
+        index = self.index
+        self.assertEqual(index.offsets[0], self.daq.cursor)
+        self.assertEqual(len(index.offsets), len(index) + 1)
+        self.assertTrue(np.all(np.diff(index.offsets) > 0))
+
+        with open(self.daq.info.filename, 'rb') as fid:
+            fid.seek(index.offsets[-1])
+            self.assertEqual(fid.read(4), np.array([-2], 'i4').tostring())
+
+class Test_sidecar(unittest.TestCase):
+    def tearDown(self):
+        time.sleep(.1)
+        for idx_file in glob.glob('./data/*.daqidx'):
+            os.remove(idx_file)
+
+    def test_readwrite(self):
+        global test_file
+        daq = Daq()
+        daq.read_daq(os.path.join('data', test_file),
+                     loaddata=False, index=True)
+        index = daq.index
+        self.assertTrue(os.path.exists(sidecar(daq.info.filename)))
+
+        index2 = DaqIndex.read(sidecar(daq.info.filename))
+
+        self.assertEqual(index.size, index2.size)
+        self.assertEqual(index.mtime, index2.mtime)
+        self.assertEqual(index.cursor, index2.cursor)
+        self.assertEqual(index.terminated, index2.terminated)
+        self.assertEqual(index.partial, index2.partial)
+        assert_array_equal(index.offsets, index2.offsets)
+        assert_array_equal(index.frame, index2.frame)
+        assert_array_equal(index.code, index2.code)
+        assert_array_equal(index.layout, index2.layout)
+        assert_array_equal(index.counts, index2.counts)
+        assert_array_equal(index.numitems, index2.numitems)
+        for ids, ids2 in zip(index.layouts, index2.layouts):
+            assert_array_equal(ids, ids2)
+
+        self.assertTrue(index2.isvalid())
+
+    def test_stale(self):
+        global test_file
+        daq = Daq()
+        daq.read_daq(os.path.join('data', test_file),
+                     loaddata=False, index=True)
+
+        index = DaqIndex.read(sidecar(daq.info.filename))
+        index.mtime -= 1.
+        self.assertFalse(index.isvalid())
+
+    def test_truncated(self):
+        global test_file
+        filename = os.path.join('data', test_file)
+        daq = Daq()
+        daq.read_daq(filename, loaddata=False, index=True)
+        index = daq.index
+
+        with open(sidecar(filename), 'rb') as fid:
+            raw = fid.read()
+
+        for nbytes in [0, 10, len(raw)//2, len(raw) - 1]:
+            with open(sidecar(filename), 'wb') as fid:
+                fid.write(raw[:nbytes])
+
+            self.assertRaises(ValueError, DaqIndex.read, sidecar(filename))
+
+            # the index is rebuilt (and the sidecar rewritten)
+            daq2 = Daq()
+            daq2.read_daq(filename, loaddata=False, index=True)
+            assert_array_equal(daq2.index.offsets, index.offsets)
+            self.assertTrue(DaqIndex.read(sidecar(filename)).isvalid())
+
+    def test_truncated_plan(self):
+        global test_file
+        filename = os.path.join('data', test_file)
+        daq = Daq()
+        daq.read_daq(filename, loaddata=False, index=True)
+
+        with open(sidecar(filename), 'r+b') as fid:
+            fid.truncate(20)
+
+        self.assertFalse(Daq.plan(filename).exact)
+
+    def test_unwritable(self):
+        global test_file
+        filename = os.path.join('data', test_file)
+
+        # the sidecar can't be written over a directory
+        os.mkdir(sidecar(filename))
+        try:
+            daq = Daq()
+            daq.read_daq(filename, index=True)
+            self.assertEqual(len(daq.index), len(daq.frame.frame))
+            self.assertTrue(len(daq.index) > 0)
+            self.assertEqual(glob.glob('./data/*.tmp'), [])
+        finally:
+            os.rmdir(sidecar(filename))
+
+def suite():
+    return unittest.TestSuite((
+            unittest.makeSuite(Test_build),
+            unittest.makeSuite(Test_sidecar)
+                              ))
+
+if __name__ == "__main__":
+    # run tests
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
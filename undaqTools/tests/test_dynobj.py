@@ -8,12 +8,13 @@ import os
 import glob
 import time
 
-from numpy.testing import assert_array_almost_equal
+import numpy as np
+from numpy.testing import assert_array_almost_equal, assert_array_equal
 import matplotlib.pyplot as plt           
 plt.rc('font', family='serif')
 
-from undaqTools import Daq
-from undaqTools.dynobj import DynObj
+from undaqTools import Daq, Element
+from undaqTools.dynobj import DynObj, _name_table
 
 test_file_large = 'Alaska_0_20130301142422.daq'
 
@@ -96,9 +97,23 @@ class Test_dynobjs(unittest.TestCase):
                                  daq.dynobjs[name],
                                  daq2.dynobjs[name])
         
+class Test_name_table(unittest.TestCase):
+    def test0(self):
+        # 2 slots of 8 chars over 3 frames
+        raw = ['1_odA', 'ab cd', '', '2_odA', '1_odA', 'x\x00y']
+        chars = np.array([list(s.ljust(8, '\x00')) for s in raw], 'S1')
+        chars = Element(chars.reshape(3, 16).T, [1, 2, 3], dtype='c')
+
+        names = _name_table(chars, width=8)
+
+        self.assertEqual(names.shape, (2, 3))
+        assert_array_equal(names, [['Ado_1', '', 'Ado_1'],
+                                   ['badc', 'Ado_2', 'xy']])
+
 def suite():
     return unittest.TestSuite((
-            unittest.makeSuite(Test_dynobjs)
+            unittest.makeSuite(Test_dynobjs),
+            unittest.makeSuite(Test_name_table)
                               ))
 
 if __name__ == "__main__":
@@ -10,7 +10,8 @@ import numpy as np
 from scipy.signal import detrend
 from numpy.testing import assert_array_equal
 
-from undaqTools import Daq, Element, fslice, findex
+from undaqTools import Daq, Element, RaggedElement, FrameAxis, fslice, findex
+from undaqTools.element import ElementMeta
 
 test_file = 'data reduction_20130204125617.daq'
 
@@ -302,6 +303,208 @@ class Test_toarray(unittest.TestCase):
         self.assertFalse(isinstance(ds, Element))
         self.assertEqual(ds.shape, (1L, 10658L))
         
+class Test_frame_axis(unittest.TestCase):
+    def setUp(self):
+        self.axis = FrameAxis(range(3000, 3009))
+
+    def test0(self):
+        axis = self.axis
+        self.assertEqual(axis.dtype, np.uint32)
+        self.assertFalse(axis.flags.writeable)
+
+        # slices are read-only views
+        part = axis[2:5]
+        self.assertTrue(isinstance(part, FrameAxis))
+        self.assertTrue(np.may_share_memory(part, axis))
+        self.assertFalse(part.flags.writeable)
+
+        # arithmetic gives plain arrays
+        self.assertFalse(isinstance(axis - 1, FrameAxis))
+
+    def test1(self):
+        axis = self.axis
+        x = Element(np.arange(9.), axis)
+        y = Element(np.arange(9.)*2, axis)
+
+        self.assertTrue(x.frames is axis)
+        self.assertTrue(y.frames is axis)
+        assert_array_equal(x[:, fslice(3002, 3005)].frames,
+                           [3002, 3003, 3004])
+
+class Test_meta(unittest.TestCase):
+    def setUp(self):
+        self.x = Element([[1., 2., 3.], [4., 5., 6.]], [3000, 3001, 3002],
+                         dtype='d', rate=1, name='VDS_Chassis_CG_Position',
+                         units='ft')
+
+    def test0(self):
+        x = self.x
+
+        self.assertTrue(isinstance(x._meta, ElementMeta))
+        self.assertEqual(x.name, 'VDS_Chassis_CG_Position')
+        self.assertEqual(x.numvalues, 2)
+        self.assertEqual(x.bytes, 8)
+
+        # views share the metadata
+        y = x[:, 1:]
+        self.assertTrue(y._meta is x._meta)
+        self.assertTrue((x*2)._meta is x._meta)
+
+    def test1(self):
+        x = self.x
+        y = x[:, 1:]
+
+        # setting an attribute replaces the metadata of that Element
+        y.rate = -2
+        self.assertEqual(y.rate, -2)
+        self.assertEqual(x.rate, 1)
+        self.assertEqual(y.units, 'ft')
+
+    def test2(self):
+        x = self.x
+        values = x.values
+
+        self.assertEqual(type(values), np.ndarray)
+        self.assertTrue(np.may_share_memory(values, x))
+        assert_array_equal(values, x)
+
+class Test_states_at(unittest.TestCase):
+    def setUp(self):
+        # CSSDC element
+        self.x = Element([[1, 2, 3], [4, 5, 6]], [3000, 3005, 3010],
+                         dtype='i', rate=-1)
+
+        # non-CSSDC element
+        self.y = Element(np.arange(10.), FrameAxis(range(3000, 3010)),
+                         dtype='d', rate=1)
+
+    def test0(self):
+        self.assertFalse(self.x.isContiguous())
+        self.assertTrue(self.y.isContiguous())
+
+    def test1(self):
+        x = self.x
+        frames = [3000, 3004, 3005, 3012]
+
+        states = x.states_at(frames)
+        self.assertEqual(states.dtype, np.int32)
+        assert_array_equal(states, [[1, 1, 2, 3], [4, 4, 5, 6]])
+
+        for j, frame in enumerate(frames):
+            assert_array_equal(states[:, j], x[:, findex(frame)].flatten())
+
+    def test2(self):
+        states = self.x.states_at([2999, 3007])
+        self.assertTrue(np.all(np.isnan(states[:, 0])))
+        assert_array_equal(states[:, 1], [2, 5])
+
+    def test3(self):
+        y = self.y
+
+        assert_array_equal(y.states_at([2990, 3000, 3009, 4000]),
+                           [[np.nan, 0, 9, 9]])
+        assert_array_equal(y[:, fslice(3002, 3005)], [[2, 3, 4]])
+        assert_array_equal(y[:, fslice(2990, 3002)], [[0, 1]])
+        self.assertEqual(y[0, findex(3004)], 4)
+
+class Test_tostrings(unittest.TestCase):
+    def setUp(self):
+        chars = np.array([list('Ado_1\x00Ado_'), list('Ado_22Ad\x00\x00')],
+                         dtype='S1')
+        self.x = Element(chars.T, [3000, 3001], dtype='c')
+
+    def test0(self):
+        assert_array_equal(self.x.tostrings(),
+                           [['Ado_1\x00Ado_', 'Ado_22Ad']])
+
+    def test1(self):
+        strings = self.x.tostrings(5)
+        self.assertEqual(strings.dtype, np.dtype('S5'))
+        assert_array_equal(strings, [['Ado_1', 'Ado_2'],
+                                     ['\x00Ado_', '2Ad']])
+
+    def test2(self):
+        self.assertRaises(ValueError, self.x.tostrings, 3)
+        self.assertRaises(TypeError,
+                          Element([[1.]], [3000]).tostrings)
+
+    def test_sliced(self):
+        # numvalues still reports the 10 rows of self.x
+        y = self.x[:5]
+        assert_array_equal(y.tostrings(), [['Ado_1', 'Ado_2']])
+        assert_array_equal(y.tostrings(5), [['Ado_1', 'Ado_2']])
+        assert_array_equal(self.x[5:].tostrings(),
+                           [['\x00Ado_', '2Ad']])
+        self.assertRaises(ValueError, y.tostrings, 3)
+
+class Test_ragged(unittest.TestCase):
+    def setUp(self):
+        # frames hold 2, 0, 3 and 1 values
+        self.x = RaggedElement([1, 2, 3, 4, 5, 6],
+                               [0, 2, 2, 5, 6],
+                               [3000, 3004, 3008, 3012],
+                               dtype='i',
+                               name='SCC_Collision_List')
+
+    def test0(self):
+        x = self.x
+
+        self.assertEqual(len(x), 4)
+        self.assertEqual(x.numvalues, 3)
+        self.assertEqual(x.nptype, np.dtype('i4'))
+        assert_array_equal(x.counts, [2, 0, 3, 1])
+        self.assertTrue(x.isCSSDC())
+
+    def test1(self):
+        x = self.x
+
+        assert_array_equal(x[0], [1, 2])
+        assert_array_equal(x[1], [])
+        assert_array_equal(x[-1], [6])
+        self.assertRaises(IndexError, x.__getitem__, 4)
+
+    def test2(self):
+        x = self.x[1:]
+
+        self.assertTrue(isinstance(x, RaggedElement))
+        assert_array_equal(x.frames, [3004, 3008, 3012])
+        assert_array_equal(x.offsets, [0, 0, 3, 4])
+        assert_array_equal(x.values, [3, 4, 5, 6])
+
+    def test3(self):
+        x = self.x[::2]
+
+        assert_array_equal(x.frames, [3000, 3008])
+        assert_array_equal(x.tolist()[0], [1, 2])
+        assert_array_equal(x.tolist()[1], [3, 4, 5])
+
+    def test4(self):
+        x = self.x[fslice(3004, 3012)]
+
+        assert_array_equal(x.frames, [3004, 3008])
+        assert_array_equal(x[1], [3, 4, 5])
+
+        x = self.x[:, fslice(3004, None)]
+        assert_array_equal(x.frames, [3004, 3008, 3012])
+
+    def test5(self):
+        x = self.x
+
+        self.assertTrue(np.isnan(x[findex(2999)]))
+        assert_array_equal(x[findex(3000)], [1, 2])
+        assert_array_equal(x[findex(3010)], [3, 4, 5])
+        assert_array_equal(x[findex(4000)], [6])
+
+    def test6(self):
+        assert_array_equal(self.x.toarray(),
+                           [[1, 0, 3, 6],
+                            [2, 0, 4, 0],
+                            [0, 0, 5, 0]])
+
+    def test7(self):
+        self.assertRaises(ValueError, RaggedElement,
+                          [1, 2, 3], [0, 2], [3000, 3001])
+
 def suite():
     return unittest.TestSuite((
             unittest.makeSuite(Test_element),
@@ -310,7 +513,12 @@ def suite():
             unittest.makeSuite(Test_state_at_frame),
             unittest.makeSuite(Test_frame_slice),
             unittest.makeSuite(Test_isCSSDC),
-            unittest.makeSuite(Test_toarray)
+            unittest.makeSuite(Test_toarray),
+            unittest.makeSuite(Test_frame_axis),
+            unittest.makeSuite(Test_meta),
+            unittest.makeSuite(Test_states_at),
+            unittest.makeSuite(Test_tostrings),
+            unittest.makeSuite(Test_ragged)
                               ))
 
 if __name__ == "__main__":
@@ -0,0 +1,113 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import glob
+import os
+import time
+import unittest
+
+import numpy as np
+from numpy.testing import assert_array_equal
+
+from undaqTools import Daq, DaqFollower, FrameAxis
+
+test_file = 'data reduction_20130204125617.daq'
+
+class Test_follow(unittest.TestCase):
+    def setUp(self):
+        global test_file
+        self.daq = daq = Daq()
+        daq.read(os.path.join('data', test_file), process_dynobjs=False)
+
+        with open(os.path.join('data', test_file), 'rb') as fid:
+            self.raw = fid.read()
+
+        self.tmp_file = os.path.join('tmp', 'follow_' + test_file)
+
+    def tearDown(self):
+        time.sleep(.1)
+        for tmp_file in glob.glob('./tmp/*'):
+            os.remove(tmp_file)
+
+    def _write(self, nbytes):
+        with open(self.tmp_file, 'wb') as fid:
+            fid.write(self.raw[:nbytes])
+
+    def test_poll(self):
+        daq = self.daq
+
+        # header plus a third of the data and part of a frame
+        self._write(daq.cursor + (len(self.raw) - daq.cursor)//3 + 5)
+        follower = DaqFollower(self.tmp_file)
+        n = follower.poll()
+
+        self.assertTrue(n > 0)
+        self.assertFalse(follower.terminated)
+        assert_array_equal(follower.daq.frame.frame, daq.frame.frame[:n])
+        assert_array_equal(follower.daq['VDS_Veh_Speed'],
+                           daq['VDS_Veh_Speed'][:, :n])
+
+        # nothing new has been written
+        self.assertEqual(follower.poll(), 0)
+
+        # the rest of the file
+        self._write(len(self.raw))
+        self.assertEqual(follower.poll() + n, len(daq.frame.frame))
+        self.assertTrue(follower.terminated)
+
+        daq2 = follower.daq
+        assert_array_equal(daq.frame.frame, daq2.frame.frame)
+        assert_array_equal(daq.frame.code, daq2.frame.code)
+        assert_array_equal(daq.frame.count, daq2.frame.count)
+
+        for k in daq:
+            if k.startswith('SCC_Spline_Lane'):
+                continue
+
+            assert_array_equal(daq[k], daq2[k])
+            assert_array_equal(daq[k].frames, daq2[k].frames)
+
+    def test_frames_view(self):
+        daq = self.daq
+        self._write(len(self.raw))
+        follower = DaqFollower(self.tmp_file)
+        follower.poll()
+
+        # the frames of the Elements are read-only views of the buffers
+        buf = follower._frames.data
+        speed = follower.daq['VDS_Veh_Speed']
+        self.assertTrue(isinstance(speed.frames, FrameAxis))
+        self.assertTrue(np.may_share_memory(speed.frames, buf))
+        self.assertFalse(speed.frames.flags.writeable)
+        self.assertTrue(follower.daq['VDS_Veh_Heading'].frames is
+                        speed.frames)
+        self.assertTrue(np.may_share_memory(follower.daq.frame.frame, buf))
+
+        cssdc = follower.daq['CIS_Turn_Signal']
+        self.assertTrue(np.may_share_memory(
+            cssdc.frames, follower._buffers['CIS_Turn_Signal_Frames'].data))
+        assert_array_equal(cssdc.frames, daq['CIS_Turn_Signal'].frames)
+
+    def test_follow(self):
+        daq = self.daq
+        self._write(len(self.raw))
+
+        follower = DaqFollower(self.tmp_file, ['VDS_Veh_Speed'])
+        chunks = list(follower.follow(interval=0.01))
+
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(list(chunks[0].keys()), ['VDS_Veh_Speed'])
+        assert_array_equal(chunks[0]['VDS_Veh_Speed'],
+                           daq['VDS_Veh_Speed'])
+
+def suite():
+    return unittest.TestSuite((
+            unittest.makeSuite(Test_follow)
+                              ))
+
+if __name__ == "__main__":
+    # run tests
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
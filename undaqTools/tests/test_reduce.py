@@ -0,0 +1,191 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+from numpy.testing import assert_array_equal, assert_array_almost_equal
+
+from undaqTools.daq import Daq, Frame
+from undaqTools.element import Element, fslice
+from undaqTools.reduce import epoch_stats, EnsembleAccumulator
+
+class Test_epoch_stats(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        frames = np.arange(100, 400)
+        self.daq = daq = Daq()
+        daq.f0, daq.fend = 100, 399
+        daq.frame = Frame(code=[0]*300, frame=frames, count=[3]*300)
+        daq['VDS_Veh_Speed'] = \
+            Element(1000. + np.random.randn(300), frames,
+                    dtype='f', rate=1, name='VDS_Veh_Speed')
+        daq['SCC_Lane_Deviation'] = \
+            Element(np.random.randn(4, 300), frames,
+                    dtype='f', rate=1, name='SCC_Lane_Deviation')
+        daq['SCC_Lane_Depart_Warn'] = \
+            Element([1, 5, -2, 7], [110, 150, 200, 390],
+                    dtype='i', rate=-1, name='SCC_Lane_Depart_Warn')
+
+        # overlapping, unsorted and partial epochs
+        self.epochs = OrderedDict([(3, fslice(150, 250)),
+                                   (1, fslice(100, 180)),
+                                   (7, fslice(300, None)),
+                                   (2, fslice(None, 120))])
+
+    def _expected(self, vec):
+        return dict(mean=np.mean(vec),
+                    min=np.min(vec),
+                    max=np.max(vec),
+                    range=np.max(vec) - np.min(vec),
+                    amean=np.mean(np.abs(vec)),
+                    sd=np.std(vec),
+                    rms=np.linalg.norm(vec)/np.sqrt(len(vec)))
+
+    def test0(self):
+        daq = self.daq
+        dvs = [('VDS_Veh_Speed', 0),
+               ('SCC_Lane_Deviation', 1),
+               ('SCC_Lane_Deviation', 3),
+               ('SCC_Lane_Depart_Warn', 0)]
+        x = epoch_stats(daq, dvs, self.epochs)
+
+        assert_array_equal(x['epoch'], [3, 1, 7, 2])
+
+        for k, fs in enumerate(self.epochs.values()):
+            for name, row, prefix in \
+                [('VDS_Veh_Speed', 0, 'VDS_Veh_Speed'),
+                 ('SCC_Lane_Deviation', 1, 'SCC_Lane_Deviation_1'),
+                 ('SCC_Lane_Deviation', 3, 'SCC_Lane_Deviation_3'),
+                 ('SCC_Lane_Depart_Warn', 0, 'SCC_Lane_Depart_Warn')]:
+
+                vec = daq[name][row, fs].flatten().astype(np.float64)
+                for stat, value in self._expected(vec).items():
+                    assert_array_almost_equal(x['%s_%s'%(prefix, stat)][k],
+                                              value)
+
+    def test_stats(self):
+        x = epoch_stats(self.daq, [('VDS_Veh_Speed', 0)],
+                        [fslice(100, 110), fslice(120, 120)],
+                        stats=['max', 'mean'])
+
+        self.assertEqual(x.dtype.names,
+                         ('epoch', 'VDS_Veh_Speed_max', 'VDS_Veh_Speed_mean'))
+        assert_array_equal(x['epoch'], [0, 1])
+        self.assertTrue(np.isnan(x['VDS_Veh_Speed_max'][1]))
+        self.assertTrue(np.isnan(x['VDS_Veh_Speed_mean'][1]))
+
+    def test_nan(self):
+        daq = self.daq
+        speed = daq['VDS_Veh_Speed']
+        speed[0, 50] = np.nan   # frame 150
+        speed[0, 280] = np.nan  # frame 380, outside the epochs
+
+        epochs = [fslice(100, 140), fslice(140, 160), fslice(200, 300)]
+        x = epoch_stats(daq, [('VDS_Veh_Speed', 0)], epochs)
+
+        for stat in ['mean', 'min', 'max', 'range', 'amean', 'sd', 'rms']:
+            values = x['VDS_Veh_Speed_%s'%stat]
+            self.assertTrue(np.isnan(values[1]), stat)
+
+            for k in [0, 2]:
+                vec = speed[0, epochs[k]].flatten().astype(np.float64)
+                expected = self._expected(vec)[stat]
+                self.assertFalse(np.isnan(values[k]), stat)
+                assert_array_almost_equal(values[k], expected)
+
+    def test_unknown_stat(self):
+        with self.assertRaises(ValueError):
+            epoch_stats(self.daq, [('VDS_Veh_Speed', 0)],
+                        [fslice(100, 110)], stats=['median'])
+
+class Test_ensemble(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(1)
+        self.grid = np.linspace(0., 100., 51)
+
+        # curves sampled on their own (irregular) abscissas
+        self.curves = []
+        for i in range(12):
+            x = np.sort(np.random.uniform(-5., 105., 200))
+            self.curves.append((50. + 10.*np.random.randn(200), x))
+
+    def _resampled(self):
+        return np.array([np.interp(self.grid, x, y) for y, x in self.curves])
+
+    def test0(self):
+        acc = EnsembleAccumulator(self.grid)
+        for y, x in self.curves:
+            acc.add(y, x)
+
+        ys = self._resampled()
+        covered = np.ones(len(self.grid), dtype=bool)
+        for y, x in self.curves:
+            covered &= (self.grid >= x[0]) & (self.grid <= x[-1])
+
+        assert_array_almost_equal(acc.mean()[covered], ys.mean(0)[covered])
+        assert_array_almost_equal(acc.var()[covered],
+                                  ys.var(0, ddof=1)[covered])
+        assert_array_almost_equal(acc.sem()[covered],
+                                  ys.std(0, ddof=1)[covered]/np.sqrt(12))
+
+    def test_coverage(self):
+        acc = EnsembleAccumulator(self.grid)
+        acc.add(Element([1., 2., 3.], [0, 1, 2], dtype='f', rate=1),
+                [10., 20., 30.])
+        acc.add([5., 5.], [20., 40.])
+
+        assert_array_equal(acc.count[:5], [0, 0, 0, 0, 0])
+        assert_array_equal(acc.count[5:11], [1, 1, 1, 1, 1, 2])
+        self.assertTrue(np.isnan(acc.mean()[0]))
+        self.assertTrue(np.isnan(acc.var()[5]))
+        self.assertAlmostEqual(acc.mean()[10], 3.5)
+
+    def test_merge(self):
+        edges = np.linspace(0., 100., 101)
+        whole = EnsembleAccumulator(self.grid, edges)
+        parts = [EnsembleAccumulator(self.grid, edges) for i in range(3)]
+
+        for i, (y, x) in enumerate(self.curves):
+            whole.add(y, x)
+            parts[i % 3].add(y, x)
+
+        merged = parts[0].merge(parts[1]).merge(parts[2])
+        assert_array_equal(merged.count, whole.count)
+        assert_array_almost_equal(merged.mean(), whole.mean())
+        assert_array_almost_equal(merged.var(), whole.var())
+        assert_array_equal(merged.quantile(.5), whole.quantile(.5))
+
+        with self.assertRaises(ValueError):
+            merged.merge(EnsembleAccumulator(self.grid))
+
+    def test_quantile(self):
+        edges = np.linspace(0., 100., 1001)
+        acc = EnsembleAccumulator(self.grid, edges)
+        for y, x in self.curves:
+            acc.add(y, x)
+
+        ys = self._resampled()
+        for q in [.1, .5, .9]:
+            expected = np.percentile(ys, 100*q, axis=0)
+
+            # within the spacing of the order statistics
+            err = np.abs(acc.quantile(q) - expected)[10:40]
+            self.assertTrue(np.all(err < 5.))
+
+        self.assertRaises(RuntimeError,
+                          EnsembleAccumulator(self.grid).quantile, .5)
+
+def suite():
+    return unittest.TestSuite((
+            unittest.makeSuite(Test_epoch_stats),
+            unittest.makeSuite(Test_ensemble)
+                              ))
+
+if __name__ == "__main__":
+    # run tests
+    runner = unittest.TextTestRunner()
+    runner.run(suite())
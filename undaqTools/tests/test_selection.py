@@ -0,0 +1,59 @@
+from __future__ import print_function
+
+# Copyright (c) 2013, Roger Lew
+# All rights reserved.
+
+import os
+import unittest
+
+from fnmatch import fnmatch
+
+from undaqTools import Daq
+from undaqTools.selection import ElemSelection, layout_plan
+
+test_file = 'data reduction_20130204125617.daq'
+
+class Test_selection(unittest.TestCase):
+    def setUp(self):
+        global test_file
+        daq = Daq()
+        daq.read_daq(os.path.join('data', test_file), loaddata=False)
+        self.names = daq._header.name
+        self._header = daq._header
+
+    def test_match(self):
+        for wclist in [['VDS*'], ['*Speed', 'CIS_?urn*', 'SCC_DynObj_[HN]*'],
+                       ['VDS_Veh_Speed'], ['nothing*'], []]:
+            selection = ElemSelection(wclist)
+            self.assertEqual(selection.mask(self.names),
+                             [any(fnmatch(name, wc) for wc in wclist)
+                              for name in self.names])
+
+    def test_match_all(self):
+        selection = ElemSelection()
+        self.assertTrue(all(selection.mask(self.names)))
+
+    def test_compile_cached(self):
+        self.assertTrue(ElemSelection.compile(['VDS*']) is
+                        ElemSelection.compile(('VDS*',)))
+        
+    def test_plan_cached(self):
+        global test_file
+        daq = Daq()
+        daq.read_daq(os.path.join('data', test_file), loaddata=False)
+
+        plan = layout_plan(self._header, ['VDS*'])
+        self.assertTrue(plan is layout_plan(daq._header, ['VDS*']))
+        self.assertFalse(plan is layout_plan(daq._header, ['CIS*']))
+        self.assertEqual(plan.mask, [fnmatch(name, 'VDS*')
+                                     for name in self.names])
+
+def suite():
+    return unittest.TestSuite((
+            unittest.makeSuite(Test_selection)
+                              ))
+
+if __name__ == "__main__":
+    # run tests
+    runner = unittest.TextTestRunner()
+    runner.run(suite())